@@ -0,0 +1,159 @@
+# alerts.py
+
+# Price alert subscriptions, checked in bulk against each Latest snapshot
+import os
+import sqlite3
+import threading
+import time
+
+# Which Latest value an alert watches
+FIELDS = {'buy': 'high', 'sell': 'low'}
+
+
+class WatchList:
+    """
+    Price alert subscriptions, stored in SQLite and evaluated against whole ``Latest`` snapshots.
+
+    The subscriptions are mirrored in numpy arrays (item ID, watched field, direction, threshold), so checking every
+    subscription against a snapshot is one vectorized pass no matter how many there are. Alerts fire once and are
+    then removed, unless ``restore`` puts them back. The arrays are reloaded when another process sharing the
+    database changes it. All methods are blocking and safe to call from worker threads.
+
+    Args:
+        path (str): The SQLite database file, created if missing.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS watches ('
+                               'id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, channel_id INTEGER, '
+                               'item_id INTEGER NOT NULL, field TEXT NOT NULL, above INTEGER NOT NULL, '
+                               'threshold INTEGER NOT NULL, created INTEGER NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS watches_user ON watches (user_id)')
+        self._arrays = None
+        self._version = None
+
+    def add(self, user_id: int, item_id: str, field: str, above: bool, threshold: int, channel_id: int = None):
+        """
+        Subscribe a user to an item's buy or sell price crossing ``threshold``.
+
+        Args:
+            user_id (int): Discord user to notify.
+            item_id (str): The item to watch.
+            field (str): ``'buy'`` or ``'sell'``.
+            above (bool): True to fire when the price is at or above ``threshold``, False for at or below.
+            threshold (int): The price to compare against.
+            channel_id (int, optional): Channel to post the alert in. Default None sends a DM.
+
+        Returns:
+            int: The ID of the new subscription.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute('INSERT INTO watches (user_id, channel_id, item_id, field, above, threshold, '
+                                        'created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                        (user_id, channel_id, int(item_id), field, int(above), threshold,
+                                         int(time.time())))
+            self._arrays = None
+        return cursor.lastrowid
+
+    def remove(self, user_id: int, watch_id: int):
+        """
+        Remove one of a user's subscriptions. Returns True if it existed.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute('DELETE FROM watches WHERE id = ? AND user_id = ?', (watch_id, user_id))
+            self._arrays = None
+        return cursor.rowcount > 0
+
+    def for_user(self, user_id: int):
+        """
+        Return a user's subscriptions as ``sqlite3.Row`` objects, oldest first.
+        """
+        with self._lock:
+            return self._conn.execute('SELECT * FROM watches WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM watches').fetchone()[0]
+
+    def _load_arrays(self):
+        import numpy as np
+
+        # data_version only changes when another connection commits, so it tells apart writes from other processes
+        self._version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        cursor = self._conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute("SELECT id, item_id, field = 'sell', above, threshold FROM watches").fetchall()
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 5).T
+        self._arrays = {
+            'id': columns[0],
+            'item_id': columns[1],
+            'low': columns[2].astype(bool),
+            'above': columns[3].astype(bool),
+            'threshold': columns[4].astype(np.float64),
+        }
+
+    def evaluate(self, high, low):
+        """
+        Check every subscription against a snapshot and remove the ones which fired.
+
+        Args:
+            high (numpy.ndarray): Latest buy prices indexed by item ID, NaN where unknown.
+            low (numpy.ndarray): Latest sell prices indexed by item ID, NaN where unknown.
+
+        Returns:
+            list: ``(row, price)`` for every subscription which fired, ``row`` being its ``sqlite3.Row``.
+        """
+        import numpy as np
+
+        with self._lock:
+            if self._arrays is None or self._conn.execute('PRAGMA data_version').fetchone()[0] != self._version:
+                self._load_arrays()
+            a = self._arrays
+            if not len(a['id']):
+                return []
+
+            # Look up each subscription's current price; unknown items compare as NaN and never fire
+            in_range = a['item_id'] < len(high)
+            item_ids = np.where(in_range, a['item_id'], 0)
+            prices = np.where(a['low'], low[item_ids], high[item_ids])
+            prices[~in_range] = np.nan
+            with np.errstate(invalid='ignore'):
+                fired = np.where(a['above'], prices >= a['threshold'], prices <= a['threshold'])
+
+            fired_ids = a['id'][fired].tolist()
+            if not fired_ids:
+                return []
+            fired_prices = dict(zip(fired_ids, prices[fired].tolist()))
+
+            with self._conn:
+                rows = []
+                for start in range(0, len(fired_ids), 500):
+                    chunk = fired_ids[start:start + 500]
+                    marks = ','.join('?' * len(chunk))
+                    rows += self._conn.execute(f'SELECT * FROM watches WHERE id IN ({marks})', chunk).fetchall()
+                    self._conn.execute(f'DELETE FROM watches WHERE id IN ({marks})', chunk)
+            self._arrays = {key: values[~fired] for key, values in a.items()}
+        return [(row, int(fired_prices[row['id']])) for row in rows]
+
+    def restore(self, rows: list):
+        """
+        Put back subscriptions removed by ``evaluate`` whose alert could not be delivered, keeping their IDs.
+
+        Args:
+            rows (list): ``sqlite3.Row`` objects as returned by ``evaluate``.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR IGNORE INTO watches (id, user_id, channel_id, item_id, field, above, '
+                                   'threshold, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   [(row['id'], row['user_id'], row['channel_id'], row['item_id'], row['field'],
+                                     row['above'], row['threshold'], row['created']) for row in rows])
+            self._arrays = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,122 @@
+# benchmarks/bench_charts.py
+
+# Size and time of the /timeseries chart for every size preset and output format, against the savefig pipeline with
+# bbox_inches="tight" it used before. Writes the images next to each other for a visual check. The bot's default
+# preset (CHART_SIZE and CHART_FORMAT, as the bot reads them) is marked with a *, and the exit status is 1 if it is
+# not smaller than the old chart.
+# Usage: python benchmarks/bench_charts.py [points] [output directory]
+import io
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from charts import CHART_FORMATS, CHART_SIZES, gap_fill, render_comparison, render_timeseries  # noqa: E402
+
+STEP = 300
+DEFAULT_SIZE = os.getenv('CHART_SIZE', 'large')
+DEFAULT_FORMAT = os.getenv('CHART_FORMAT', 'png8')
+
+
+def synthetic_series(points: int, seed: int = 0):
+    random.seed(seed)
+    now = int(time.time()) // STEP * STEP
+    price = 10000.0
+    rows = []
+    for i in range(points):
+        price *= 1 + random.gauss(0, 0.01)
+        if random.random() < 0.05:
+            continue
+        high = price * (1 + abs(random.gauss(0, 0.01)))
+        rows.append((now - (points - i) * STEP, high, price, random.randint(0, 500), random.randint(0, 500)))
+    return np.array(rows, dtype=np.float64)
+
+
+def legacy_render(data, step, item_name, item_id):
+    # The volume chart as drawn before the fixed layout, decimation and Pillow encoding
+    import matplotlib.style as mplstyle
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, step)
+    with mplstyle.context('dark_background'):
+        fig = Figure(figsize=(15, 10))
+        axs = fig.subplots(nrows=2, sharex=False)
+        fig.subplots_adjust(hspace=0.5)
+        axs[0].plot(timestamps, high, label='High Price', color='#ffa333')
+        axs[0].plot(timestamps, low, label='Low Price', color='#33ff5f')
+        axs[0].legend()
+        axs[0].set_title(f'Price - {item_name.capitalize()} - ID {item_id}')
+        axs[1].bar(timestamps, high_volume, width=step / 86400, label='High Price Volume', color='#ffa333',
+                   ec="k", lw=0.1)
+        axs[1].bar(timestamps, low_volume, width=step / 86400, label='Low Price Volume', color='#33ff5f',
+                   ec="k", lw=0.1)
+        axs[1].legend()
+        axs[1].set_title(f'Volume - {item_name.capitalize()} - ID {item_id}')
+        FigureCanvasAgg(fig)
+        data_stream = io.BytesIO()
+        fig.savefig(data_stream, format='png', bbox_inches="tight", dpi=80)
+    return data_stream.getvalue()
+
+
+def best_of(func, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        if time.perf_counter() - start < best:
+            best, result = time.perf_counter() - start, value
+    return best, result
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    output = sys.argv[2] if len(sys.argv) > 2 else None
+    data = synthetic_series(points)
+    render_timeseries(data, STEP, 'warm up', '1', True, 'small', 'png')
+
+    seconds, png = best_of(lambda: legacy_render(data, STEP, 'Dragon bones', '536'))
+    print(f'{len(data)} points, legacy savefig (tight bbox): {len(png) / 1024:7.1f} KiB in {seconds * 1000:6.0f} ms')
+    if output:
+        os.makedirs(output, exist_ok=True)
+        with open(os.path.join(output, 'legacy.png'), 'wb') as f:
+            f.write(png)
+
+    default_bytes = None
+    print(f'  {"size":<8}{"format":<7}{"KiB":>8}{"draw ms":>9}{"encode ms":>11}{"total ms":>10}')
+    for size in CHART_SIZES:
+        for fmt in CHART_FORMATS:
+            seconds, chart = best_of(lambda: render_timeseries(data, STEP, 'Dragon bones', '536', True, size, fmt))
+            default = size == DEFAULT_SIZE and fmt == DEFAULT_FORMAT
+            if default:
+                default_bytes = len(chart.image)
+            print(f'{"*" if default else " "} {size:<8}{fmt:<7}{len(chart.image) / 1024:8.1f}'
+                  f'{chart.draw_seconds * 1000:9.0f}{chart.encode_seconds * 1000:11.0f}{seconds * 1000:10.0f}')
+            if output:
+                with open(os.path.join(output, f'timeseries-{size}-{fmt}.{chart.extension}'), 'wb') as f:
+                    f.write(chart.image)
+
+    series = [synthetic_series(points, seed) for seed in range(4)]
+    seconds, chart = best_of(lambda: render_comparison(series, STEP, ['a', 'b', 'c', 'd'], DEFAULT_SIZE,
+                                                       DEFAULT_FORMAT))
+    print(f'comparison of 4 items, {DEFAULT_SIZE} {DEFAULT_FORMAT}: {len(chart.image) / 1024:.1f} KiB in '
+          f'{seconds * 1000:.0f} ms')
+    if output:
+        with open(os.path.join(output, f'comparison.{chart.extension}'), 'wb') as f:
+            f.write(chart.image)
+
+    if default_bytes is None:
+        print(f'Default preset {DEFAULT_SIZE} {DEFAULT_FORMAT} is not a known size and format')
+        return 1
+    if default_bytes >= len(png):
+        print(f'Default preset {DEFAULT_SIZE} {DEFAULT_FORMAT} is not smaller than the legacy chart: '
+              f'{default_bytes / 1024:.1f} KiB against {len(png) / 1024:.1f} KiB')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
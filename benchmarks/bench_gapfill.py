@@ -0,0 +1,112 @@
+# benchmarks/bench_gapfill.py
+
+# Checks charts.gap_fill against the pandas pipeline /timeseries used before, and compares their latency and
+# allocations. pandas is optional and not in requirements.txt: without it only gap_fill is timed, and correctness
+# is left to tests/test_charts.py.
+# Usage: python benchmarks/bench_gapfill.py
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from charts import gap_fill  # noqa: E402
+
+FIELDS = ['timestamp', 'avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume']
+
+
+def pandas_gap_fill(series, freq):
+    # The transform /timeseries ran before gap_fill replaced it
+    df = pd.DataFrame(series)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+
+    start = pd.to_datetime(df[['timestamp'][0]].min(), unit='s')
+    end = pd.to_datetime(df[['timestamp'][0]].max(), unit='s')
+    dates = pd.date_range(start=start, end=end, freq=freq).to_pydatetime()
+
+    df = df.set_index('timestamp').reindex(dates).reset_index().reindex(columns=df.columns)
+
+    df[['avgHighPrice', 'avgLowPrice']] = df[['avgHighPrice', 'avgLowPrice']].ffill()
+    df[['highPriceVolume', 'lowPriceVolume']] = df[['highPriceVolume', 'lowPriceVolume']].fillna(0)
+    df[['lowPriceVolume']] = df[['lowPriceVolume']] * -1
+    return df
+
+
+def synthetic_series(n, step, seed):
+    random.seed(seed)
+    series = []
+    for i in range(n):
+        if random.random() < 0.1:
+            continue  # missing interval
+        series.append({'timestamp': 1700000100 + i * step,
+                       'avgHighPrice': random.randint(100, 200) if random.random() > 0.2 else None,
+                       'avgLowPrice': random.randint(90, 190) if random.random() > 0.2 else None,
+                       'highPriceVolume': random.randint(0, 5000),
+                       'lowPriceVolume': random.randint(0, 5000) if random.random() > 0.1 else None})
+    return series
+
+
+def as_array(series):
+    return np.array([[p[f] for f in FIELDS] for p in series], dtype=np.float64)
+
+
+def check(series, step, freq):
+    expected = pandas_gap_fill(series, freq)
+    timestamps, high, low, high_volume, low_volume = gap_fill(as_array(series), step)
+
+    np.testing.assert_array_equal(timestamps.astype('datetime64[ns]'), expected['timestamp'].to_numpy())
+    np.testing.assert_array_equal(high, expected['avgHighPrice'].to_numpy(dtype=float))
+    np.testing.assert_array_equal(low, expected['avgLowPrice'].to_numpy(dtype=float))
+    np.testing.assert_array_equal(high_volume, expected['highPriceVolume'].to_numpy(dtype=float))
+    np.testing.assert_array_equal(low_volume, expected['lowPriceVolume'].to_numpy(dtype=float))
+
+
+def peak_allocation(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    if pd is None:
+        print('pandas is not installed, only timing gap_fill')
+    else:
+        for seed in range(20):
+            for step, freq in ((300, '5min'), (3600, '1h')):
+                check(synthetic_series(365, step, seed), step, freq)
+        # Leading gaps stay NaN, single points work
+        check([{'timestamp': 0, 'avgHighPrice': None, 'avgLowPrice': 5, 'highPriceVolume': None, 'lowPriceVolume': 1},
+               {'timestamp': 600, 'avgHighPrice': 7, 'avgLowPrice': None, 'highPriceVolume': 2,
+                'lowPriceVolume': None}],
+              300, '5min')
+        check(synthetic_series(1, 300, 0), 300, '5min')
+        print('gap_fill matches the pandas pipeline')
+
+    print(f'{"points":>8}{"pandas (ms)":>14}{"numpy (ms)":>13}{"pandas peak":>14}{"numpy peak":>13}')
+    for n in (365, 2000, 10000):
+        series = synthetic_series(n, 300, 1)
+        data = as_array(series)
+        runs = 20
+        t_numpy = timeit.timeit(lambda: gap_fill(data, 300), number=runs) / runs
+        m_numpy = peak_allocation(lambda: gap_fill(data, 300))
+        if pd is None:
+            print(f'{n:>8}{"-":>14}{t_numpy * 1000:>13.3f}{"-":>14}{m_numpy / 1024:>11.0f}KB')
+            continue
+        t_pandas = timeit.timeit(lambda: pandas_gap_fill(series, '5min'), number=runs) / runs
+        m_pandas = peak_allocation(lambda: pandas_gap_fill(series, '5min'))
+        print(f'{n:>8}{t_pandas * 1000:>14.2f}{t_numpy * 1000:>13.3f}'
+              f'{m_pandas / 1024:>12.0f}KB{m_numpy / 1024:>11.0f}KB')
+
+
+if __name__ == '__main__':
+    main()
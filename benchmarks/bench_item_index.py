@@ -0,0 +1,84 @@
+# benchmarks/bench_item_index.py
+
+# Micro-benchmark of ItemIndex against the linear scan /itemid used to do over item_map
+# Usage: python benchmarks/bench_item_index.py [mapping.json]
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from items import ItemIndex  # noqa: E402
+
+WORDS = ['rune', 'adamant', 'mithril', 'dragon', 'crystal', 'bones', 'coal', 'ore', 'bar', 'platebody', 'sword',
+         'shield', 'potion', 'seed', 'logs', 'arrow', 'bolts', 'twisted', 'bow', 'ring', 'amulet', 'of', 'the',
+         'ancient', 'blessed', 'battlestaff', 'hide', 'scale', 'rune', 'essence', 'zulrah', 'toxic', 'blowpipe']
+
+
+# Real names mixed into the synthetic mapping, with misspellings /latest should resolve to them
+TYPOS = {'Dragon bones': ['dragon bone', 'dragn bones', 'DRAGON BONES', 'dargon bones'],
+         'Abyssal whip': ['abysal whip', 'abyssal wip', 'abbysal whip'],
+         'Twisted bow': ['twisted bwo', 'twistd bow'],
+         'Zulrah\'s scales': ['zulrahs scales', 'zulrah scales'],
+         'Saradomin brew(4)': ['saradomin brew 4', 'sardomin brew(4)'],
+         'Cannonball': ['canonball', 'cannon ball']}
+
+
+def synthetic_mapping(n=4000):
+    random.seed(0)
+    names = set(TYPOS)
+    while len(names) < n:
+        names.add(' '.join(random.sample(WORDS, random.randint(1, 4))).capitalize() + f' ({random.randint(1, 9)})')
+    return [{'id': i, 'name': name} for i, name in enumerate(sorted(names))]
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            mapping = json.load(f)
+    else:
+        mapping = synthetic_mapping()
+
+    item_map = {}
+    for d in mapping:
+        item_map[str(d['id'])] = d
+        item_map[d['name']] = d
+
+    build = timeit.timeit(lambda: ItemIndex(mapping), number=5) / 5
+    index = ItemIndex(mapping)
+    print(f'{len(mapping)} items, index build {build * 1000:.1f} ms')
+
+    queries = ['coal', 'dragon bones', 'bow', 'ru', 'zz', 'Crystal', 'of the']
+    print(f'{"query":<14}{"scan (us)":>12}{"index (us)":>12}{"speedup":>10}')
+    for query in queries:
+        scan = [(k, v['id']) for k, v in item_map.items() if query.lower() in k.lower() and not k.isnumeric()]
+        indexed = [(d['name'], d['id']) for d in index.search(query)]
+        assert sorted(scan) == sorted(indexed), query
+
+        n = 200
+        t_scan = timeit.timeit(lambda: [(k, v['id']) for k, v in item_map.items() if query.lower() in k.lower()],
+                               number=n) / n
+        t_index = timeit.timeit(lambda: index.search(query), number=n) / n
+        print(f'{query:<14}{t_scan * 1e6:>12.1f}{t_index * 1e6:>12.1f}{t_scan / t_index:>9.1f}x')
+
+    n = 2000
+    t_cap = timeit.timeit(lambda: item_map.get('dragon bones'.capitalize()), number=n) / n
+    t_exact = timeit.timeit(lambda: index.exact('DRAGON BONES'), number=n) / n
+    t_complete = timeit.timeit(lambda: index.complete('dra'), number=n) / n
+    print(f'exact: capitalize+dict {t_cap * 1e6:.2f} us, index {t_exact * 1e6:.2f} us; '
+          f'complete("dra") {t_complete * 1e6:.1f} us')
+
+    if len(sys.argv) > 1:
+        return
+    print(f'{"misspelling":<20}{"resolved to":<20}{"resolve (us)":>14}')
+    for name, typos in TYPOS.items():
+        for typo in typos:
+            match, suggestions = index.resolve(typo)
+            resolved = match['name'] if match else 'did you mean ' + ', '.join(suggestions)
+            t_resolve = timeit.timeit(lambda: index.resolve(typo), number=n) / n
+            print(f'{typo:<20}{resolved:<20}{t_resolve * 1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
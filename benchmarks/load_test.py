@@ -0,0 +1,324 @@
+# benchmarks/load_test.py
+
+# Offline load test of the slash command handlers. A local stub serves the prices API and MediaWiki endpoints from
+# fixtures, the handlers are called directly with fake ApplicationContexts, and latency, throughput and peak RSS are
+# reported per command.
+#
+# Usage: python benchmarks/load_test.py [--commands latest,timeseries] [--concurrency 16] [--requests 200]
+#        python benchmarks/load_test.py --record fixtures/   (save live wiki responses as fixtures, needs network)
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+import aiohttp
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+COMMANDS = ('latest', 'average', 'timeseries', 'property_lookup', 'itemid', 'margins', 'movers', 'compare')
+
+WORDS = ['rune', 'adamant', 'mithril', 'dragon', 'crystal', 'bones', 'coal', 'ore', 'bar', 'platebody', 'sword',
+         'shield', 'potion', 'seed', 'logs', 'arrow', 'bolts', 'twisted', 'bow', 'ring', 'amulet', 'ancient']
+
+
+def synthetic_fixtures(items: int = 4000, seed: int = 0):
+    """
+    Build fixtures shaped like the real API responses: mapping, latest, 5m and 1h snapshots. Timeseries and
+    smwbrowse responses are generated per request by the stub.
+    """
+    random.seed(seed)
+    names = set()
+    while len(names) < items:
+        names.add(' '.join(random.sample(WORDS, random.randint(1, 3))).capitalize() + f' {random.randint(1, 99)}')
+
+    mapping = [{'examine': 'An item.', 'id': i * 2 + 2, 'members': bool(i % 2), 'lowalch': 10, 'limit': 100 * (i % 50),
+                'value': 25, 'highalch': 15, 'icon': f'{name}.png', 'name': name}
+               for i, name in enumerate(sorted(names))]
+    now = int(time.time())
+    latest = {str(d['id']): {'high': random.randint(10, 10 ** 6), 'highTime': now - random.randint(0, 3600),
+                             'low': random.randint(10, 10 ** 6), 'lowTime': now - random.randint(0, 3600)}
+              for d in mapping}
+    averages = {}
+    for route in ('5m', '1h'):
+        averages[route] = {str(d['id']): {'avgHighPrice': random.randint(10, 10 ** 6),
+                                          'highPriceVolume': random.randint(0, 10 ** 4),
+                                          'avgLowPrice': random.randint(10, 10 ** 6),
+                                          'lowPriceVolume': random.randint(0, 10 ** 4)} for d in mapping}
+    return {'mapping': mapping, 'latest': {'data': latest}, '5m': {'data': averages['5m'], 'timestamp': now},
+            '1h': {'data': averages['1h'], 'timestamp': now}}
+
+
+def load_fixtures(directory: str):
+    fixtures = {}
+    for name in ('mapping', 'latest', '5m', '1h'):
+        with open(os.path.join(directory, name + '.json')) as f:
+            fixtures[name] = json.load(f)
+    return fixtures
+
+
+async def record_fixtures(directory: str, user_agent: str):
+    os.makedirs(directory, exist_ok=True)
+    async with aiohttp.ClientSession(headers={'User-Agent': user_agent}) as session:
+        for name in ('mapping', 'latest', '5m', '1h'):
+            async with session.get('https://prices.runescape.wiki/api/v1/osrs/' + name) as response:
+                response.raise_for_status()
+                body = await response.read()
+            with open(os.path.join(directory, name + '.json'), 'wb') as f:
+                f.write(body)
+            print(f'Recorded {name} ({len(body)} bytes)')
+
+
+def timeseries_response(item_id: str, timestep: str):
+    step = {'5m': 300, '1h': 3600, '6h': 21600, '24h': 86400}[timestep]
+    end = int(time.time()) // step * step - step
+    rng = random.Random(f'{item_id}-{timestep}-{end}')
+    price = rng.randint(100, 10 ** 6)
+    data = []
+    for i in range(365):
+        if rng.random() < 0.05:
+            continue
+        price = max(1, int(price * rng.uniform(0.98, 1.02)))
+        data.append({'timestamp': end - (364 - i) * step, 'avgHighPrice': price if rng.random() > 0.1 else None,
+                     'avgLowPrice': int(price * 0.98) if rng.random() > 0.1 else None,
+                     'highPriceVolume': rng.randint(0, 5000), 'lowPriceVolume': rng.randint(0, 5000)})
+    return {'data': data, 'itemId': int(item_id)}
+
+
+def smwbrowse_response(subject: str):
+    properties = {'All_Item_ID': ['12345'], 'All_Weight': ['1.0'], 'Is_members_only': ['true'],
+                  'All_Examine': [f'It is {subject}.'], 'All_Value': ['25'], '_INST': ['Items'],
+                  '_MDAT': ['1/2024/1/1/0/0/0'], '_SKEY': [subject]}
+    return {'query': {'subject': subject, 'data': [
+        {'property': name, 'dataitem': [{'type': 2, 'item': value} for value in values]}
+        for name, values in properties.items()]}}
+
+
+def stub_app(fixtures: dict, latency: float):
+    """
+    aiohttp app imitating prices.runescape.wiki and the MediaWiki api.php, adding ``latency`` seconds per response.
+    """
+    counts = {}
+
+    async def respond(name, body):
+        counts[name] = counts.get(name, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response(body)
+
+    async def prices(request):
+        route = request.match_info['route']
+        if route == 'timeseries':
+            return await respond(route, timeseries_response(request.query['id'], request.query['timestep']))
+        if route not in fixtures:
+            return web.Response(status=404)
+        return await respond(route, fixtures[route])
+
+    async def mediawiki(request):
+        subject = json.loads(request.query['params'])['subject'].replace('_', ' ')
+        return await respond('smwbrowse', smwbrowse_response(subject))
+
+    app = web.Application()
+    app.router.add_get('/api/v1/osrs/{route}', prices)
+    app.router.add_get('/api.php', mediawiki)
+    app['counts'] = counts
+    return app
+
+
+class FakeAuthor:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f'user{user_id}'
+        self.jump_url = f'https://discord.com/users/{user_id}'
+        self.display_avatar = type('Avatar', (), {'url': 'https://cdn.discordapp.com/embed/avatars/0.png'})()
+
+    def __str__(self):
+        return self.display_name
+
+
+class FakeContext:
+    """
+    Stand-in for ``discord.ApplicationContext`` recording what a handler sends instead of calling Discord.
+    """
+    _next_id = 0
+
+    def __init__(self):
+        FakeContext._next_id += 1
+        self.author = FakeAuthor(FakeContext._next_id)
+        self.channel_id = 1
+        self.guild = None
+        self.interaction = type('Interaction', (), {'id': FakeContext._next_id})()
+        self.messages = 0
+        self.bytes = 0
+
+    async def defer(self, ephemeral: bool = False):
+        pass
+
+    async def respond(self, content=None, embed=None, embeds=None, file=None, ephemeral=False):
+        self.messages += 1
+        if file is not None:
+            self.bytes += len(file.fp.read())
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux. RUSAGE_CHILDREN only covers children which have exited, so the render
+    # processes are counted once the pool is shut down.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+async def run(args):
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        fixtures = synthetic_fixtures(args.items)
+
+    app = stub_app(fixtures, args.latency)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    data_dir = tempfile.mkdtemp(prefix='rswiki-bench-')
+    os.environ.update({'PRICES_API': f'http://127.0.0.1:{port}/api/v1/',
+                       'OSRS_WIKI_API': f'http://127.0.0.1:{port}/api.php',
+                       'RS3_WIKI_API': f'http://127.0.0.1:{port}/api.php',
+                       'DATA_DIR': data_dir, 'PROPERTY_CACHE_DISK': '0'})
+
+    sys.path.insert(0, ROOT)
+    from items import save_mapping_file
+    save_mapping_file(os.path.join(data_dir, 'mapping.json'), json.dumps(fixtures['mapping']).encode())
+
+    import logging
+    logging.disable(logging.WARNING)
+    start = time.perf_counter()
+    import wikibot
+    wikibot.setup()
+    print(f'wikibot loaded in {time.perf_counter() - start:.2f}s, {len(wikibot.item_index)} items, '
+          f'stub on port {port}, data in {data_dir}')
+
+    names = [d['name'] for d in fixtures['mapping']]
+    rng = random.Random(1)
+    popular = rng.sample(names, min(len(names), args.popular))
+
+    def pick(n=1):
+        return '|'.join(rng.choice(popular) for _ in range(n))
+
+    calls = {
+        'latest': lambda ctx: wikibot.latest.callback(ctx, pick(args.items_per_call), None),
+        'average': lambda ctx: wikibot.average.callback(ctx, pick(args.items_per_call), rng.choice(['5m', '1h']),
+                                                        None),
+        'timeseries': lambda ctx: wikibot.timeseries.callback(ctx, pick(), '5m', True, 365, None),
+        'compare': lambda ctx: wikibot.compare.callback(ctx, pick(4), '5m', 365, None),
+        'property_lookup': lambda ctx: wikibot.property_lookup.callback(ctx, pick(), 'osrs', 'all'),
+        'itemid': lambda ctx: wikibot.id_lookup.callback(ctx, rng.choice(WORDS)),
+        'margins': lambda ctx: wikibot.margins.callback(ctx, rng.choice(['margin', 'roi', 'potential']), 10, 0),
+        'movers': lambda ctx: wikibot.movers.callback(ctx, rng.choice(['gainers', 'losers', 'volume']), 10, 100),
+    }
+
+    def reset_caches():
+        wikibot.snapshot_cache.invalidate()
+        wikibot.chart_cache = type(wikibot.chart_cache)(wikibot.chart_cache.max_bytes)
+        wikibot.property_cache.invalidate()
+
+    results = {}
+    for command in args.commands:
+        latencies = []
+        errors = 0
+        counts_before = dict(app['counts'])
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                if args.cold:
+                    reset_caches()
+                ctx = FakeContext()
+                started = time.perf_counter()
+                try:
+                    await calls[command](ctx)
+                except Exception as e:  # noqa: E722 - a failing handler is a result, not a harness error
+                    errors += 1
+                    if errors == 1:
+                        print(f'{command} raised {type(e).__name__}: {e}')
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        upstream = sum(app['counts'].values()) - sum(counts_before.values())
+        results[command] = {'requests': len(latencies), 'errors': errors,
+                            'p50_ms': 1000 * percentile(latencies, 0.5), 'p99_ms': 1000 * percentile(latencies, 0.99),
+                            'throughput': len(latencies) / elapsed, 'upstream_requests': upstream,
+                            'peak_rss_mb': peak_rss_mb()}
+
+    print(f'\nconcurrency {args.concurrency}, {args.requests} requests per command, stub latency '
+          f'{args.latency * 1000:.0f}ms{", cold caches" if args.cold else ""}')
+    print(f'{"command":<16}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>9}{"errors":>8}{"upstream":>10}{"RSS MB":>9}')
+    for command, r in results.items():
+        print(f'{command:<16}{r["p50_ms"]:>9.1f}{r["p99_ms"]:>9.1f}{r["throughput"]:>9.1f}{r["errors"]:>8}'
+              f'{r["upstream_requests"]:>10}{r["peak_rss_mb"]:>9.0f}')
+
+    charts = dict(wikibot.chart_output)
+    if charts['charts']:
+        print(f'{charts["charts"]} charts rendered as {wikibot.chart_format}, '
+              f'{charts["bytes"] / charts["charts"] / 1024:.1f} KiB, '
+              f'{1000 * charts["draw_seconds"] / charts["charts"]:.0f} ms drawing and '
+              f'{1000 * charts["encode_seconds"] / charts["charts"]:.0f} ms encoding on average')
+
+    wikibot.render_pool.shutdown(wait=True)
+    children = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(f'peak RSS of a render worker: {children:.0f} MB')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commands': results, 'charts': charts, 'peak_child_rss_mb': children}, f, indent=2)
+
+    await wikibot.wiki.close()
+    await runner.cleanup()
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test of the wikibot command handlers')
+    parser.add_argument('--commands', default=','.join(COMMANDS),
+                        help=f'Comma separated commands to run (default {",".join(COMMANDS)})')
+    parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous invocations (default 16)')
+    parser.add_argument('--requests', type=int, default=200, help='Invocations per command (default 200)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub response latency in seconds (default 0.05)')
+    parser.add_argument('--items', type=int, default=4000, help='Items in the synthetic fixtures (default 4000)')
+    parser.add_argument('--popular', type=int, default=50, help='Distinct items requested (default 50)')
+    parser.add_argument('--items-per-call', type=int, default=1, help='Items per /latest and /average call')
+    parser.add_argument('--cold', action='store_true', help='Drop the in-memory caches before every invocation')
+    parser.add_argument('--fixtures', help='Directory of recorded fixtures (default synthetic)')
+    parser.add_argument('--record', help='Record live wiki responses into this directory and exit')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record_fixtures(args.record, os.getenv('USER_AGENT', 'RSWiki Bot benchmark')))
+        return
+
+    args.commands = [c for c in args.commands.split(',') if c]
+    unknown = set(args.commands) - set(COMMANDS)
+    if unknown:
+        parser.error(f'Unknown commands {unknown}')
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
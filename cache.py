@@ -0,0 +1,365 @@
+# cache.py
+
+# Caches shared by the slash command handlers
+import asyncio
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class SnapshotCache:
+    """
+    Process-wide cache for the all-items price snapshots served by the real-time prices API.
+
+    Every ``Latest`` or ``AvgPrice`` query downloads the price data for every item, so one snapshot per endpoint and
+    route is kept and handed out until its TTL runs out. The TTL counts from when the snapshot was fetched from the
+    API, which the loader reports, so a copy fetched earlier by another process is not kept for longer. When several
+    commands find a stale entry at the same time, only the first one runs the loader; the others wait on the same
+    lock and reuse its result.
+
+    Args:
+        ttls (dict): Seconds a snapshot stays fresh, keyed by route (``'latest'``, ``'5m'``, ``'1h'``).
+        default_ttl (int, optional): TTL used for any route missing from ``ttls``. Default 60.
+
+    Attributes:
+        hits (int): Number of lookups answered from a fresh snapshot.
+        misses (int): Number of lookups which had to run the loader.
+    """
+    def __init__(self, ttls: dict, default_ttl: int = 60):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._locks = {}
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        fetched, value = entry
+        if time.time() - fetched < self.ttls.get(key[1], self.default_ttl):
+            return value
+        return None
+
+    async def get(self, endpoint: str, route: str, loader):
+        """
+        Return the snapshot for ``(endpoint, route)``, running ``loader`` if the cached copy is missing or stale.
+
+        Args:
+            endpoint (str): The API the snapshot comes from (ex. ``'osrs'`` for the OSRS prices API).
+            route (str): The route within the endpoint, used to pick the TTL.
+            loader: Zero-argument callable returning ``(fetched, snapshot)``, or an awaitable resolving to it.
+                ``fetched`` is the Unix time the snapshot was fetched from the API.
+
+        Returns:
+            The cached or freshly loaded snapshot. Exceptions raised by ``loader`` propagate and nothing is cached.
+        """
+        key = (endpoint, route)
+        value = self._fresh(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another command may have refreshed the entry while we waited on the lock
+            value = self._fresh(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            logging.debug(f'Snapshot cache miss for {key}, loading')
+            loaded = loader()
+            if inspect.isawaitable(loaded):
+                loaded = await loaded
+            self._entries[key] = loaded
+            return loaded[1]
+
+    def age(self, endpoint: str, route: str):
+        """
+        Return the age in seconds of the snapshot cached for ``(endpoint, route)``, or None if there is none.
+        """
+        entry = self._entries.get((endpoint, route))
+        if entry is None:
+            return None
+        return time.time() - entry[0]
+
+    def invalidate(self, endpoint: str = None, route: str = None):
+        """
+        Drop cached snapshots. With no arguments every entry is dropped, otherwise only the matching ones.
+        """
+        for key in list(self._entries):
+            if (endpoint is None or key[0] == endpoint) and (route is None or key[1] == route):
+                del self._entries[key]
+
+    def stats(self):
+        """
+        Return the hit/miss counters and the age in seconds of every cached snapshot.
+        """
+        now = time.time()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': {f'{e}/{r}': round(now - fetched, 1) for (e, r), (fetched, _) in self._entries.items()},
+        }
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache of ``bytes`` values, capped by total size.
+
+    Args:
+        max_bytes (int): Total size of the stored values above which the least recently used entries are evicted.
+
+    Attributes:
+        hits (int): Number of lookups which found an entry.
+        misses (int): Number of lookups which found nothing.
+        evictions (int): Number of entries dropped to stay under ``max_bytes``.
+        size (int): Current total size of the stored values in bytes.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the value stored for ``key`` and mark it as most recently used, or None if it is not cached.
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value: bytes):
+        """
+        Store ``value`` under ``key``, evicting least recently used entries until the cache fits in ``max_bytes``.
+        Values larger than ``max_bytes`` are not stored.
+        """
+        if len(value) > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+
+        self._entries[key] = value
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self),
+                'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+class PropertyCache:
+    """
+    Cache of cleaned MediaWiki property dictionaries keyed by game and item name.
+
+    Entries live in a bounded in-memory LRU and, if ``path`` is given, in an SQLite file as well, so they survive
+    restarts. Both tiers expire entries after ``ttl`` seconds. Processes sharing the file also share invalidations:
+    each one drops its memory tier when it sees another has invalidated entries. Lookups are counted per item to
+    find the most requested ones for prefetching, and the counts are saved to the file by lookups at most every
+    ``flush_interval`` seconds. All methods are blocking and safe to call from worker threads.
+
+    Args:
+        max_entries (int): Entries kept in memory before the least recently used are evicted.
+        ttl (float): Seconds an entry stays valid.
+        path (str, optional): SQLite file for the on-disk tier. Default None keeps entries in memory only.
+        flush_interval (float, optional): Seconds between saves of the request counts. Default 300.
+
+    Attributes:
+        hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from the on-disk tier.
+        misses (int): Lookups which found no valid entry.
+        evictions (int): Entries dropped from memory to stay under ``max_entries``.
+        requests (collections.Counter): Lookup count per ``(game, item)``.
+    """
+    def __init__(self, max_entries: int, ttl: float, path: str = None, flush_interval: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.requests = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None
+        self._flushed = time.time()
+
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # Shards share the file, so writers wait for each other instead of failing with "database is locked"
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._conn:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('CREATE TABLE IF NOT EXISTS properties (game TEXT NOT NULL, item TEXT NOT NULL, '
+                                   'fetched REAL, requests INTEGER NOT NULL DEFAULT 0, content TEXT, '
+                                   'PRIMARY KEY (game, item))')
+                self._conn.execute('CREATE TABLE IF NOT EXISTS invalidations (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                                   'version INTEGER NOT NULL)')
+                self._conn.execute('INSERT OR IGNORE INTO invalidations VALUES (0, 0)')
+            self._version = self._conn.execute('SELECT version FROM invalidations').fetchone()[0]
+            for game, item, requests in self._conn.execute('SELECT game, item, requests FROM properties'):
+                self.requests[(game, item)] = requests
+
+    def _sync(self):
+        # Another process sharing the file invalidated entries, which only its own memory tier has forgotten
+        if self._conn is None:
+            return
+        version = self._conn.execute('SELECT version FROM invalidations').fetchone()[0]
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+
+    def _remember(self, key, fetched, content):
+        self._entries[key] = (fetched, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, game: str, item: str, count: bool = True):
+        """
+        Return the cached properties for an item, or None if there is no entry younger than ``ttl``.
+
+        Args:
+            count (bool, optional): Count this lookup as a request for the item. Default True.
+        """
+        key = (game, item)
+        now = time.time()
+        with self._lock:
+            if count:
+                self.requests[key] += 1
+                if now - self._flushed >= self.flush_interval:
+                    try:
+                        self._flush_requests()
+                    except sqlite3.OperationalError as e:
+                        # The counts are only used to pick items to prefetch, so the lookup is answered anyway
+                        logging.warning(f'Could not save the property request counts: {e}')
+
+            self._sync()
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT fetched, content FROM properties WHERE game = ? AND item = ? '
+                                         'AND fetched > ?', (game, item, now - self.ttl)).fetchone()
+                if row is not None:
+                    content = json.loads(row[1])
+                    self._remember(key, row[0], content)
+                    self.disk_hits += 1
+                    return content
+
+            self.misses += 1
+            return None
+
+    def put(self, game: str, item: str, content: dict):
+        """
+        Store the properties for an item in memory and, if enabled, on disk.
+        """
+        key = (game, item)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, content)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('INSERT OR REPLACE INTO properties VALUES (?, ?, ?, ?, ?)',
+                                       (game, item, now, self.requests[key], json.dumps(content, default=str)))
+
+    def age(self, game: str, item: str):
+        """
+        Return the age in seconds of the entry for an item in either tier, or None if there is none.
+        """
+        with self._lock:
+            self._sync()
+            entry = self._entries.get((game, item))
+            if entry is not None:
+                return time.time() - entry[0]
+            if self._conn is not None:
+                row = self._conn.execute('SELECT fetched FROM properties WHERE game = ? AND item = ?',
+                                         (game, item)).fetchone()
+                if row is not None and row[0] is not None:
+                    return time.time() - row[0]
+        return None
+
+    def invalidate(self, game: str = None, item: str = None):
+        """
+        Drop entries from both tiers. With no arguments everything is dropped, otherwise only the matching entries.
+        Other processes sharing the file clear their memory tier on their next lookup. Request counts are kept.
+
+        Returns:
+            int: Number of in-memory entries dropped.
+        """
+        def matches(key):
+            return (game is None or key[0] == game) and (item is None or key[1] == item)
+
+        with self._lock:
+            dropped = [key for key in self._entries if matches(key)]
+            for key in dropped:
+                del self._entries[key]
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('UPDATE properties SET fetched = NULL, content = NULL '
+                                       'WHERE (? IS NULL OR game = ?) AND (? IS NULL OR item = ?)',
+                                       (game, game, item, item))
+                    self._conn.execute('UPDATE invalidations SET version = version + 1')
+                    self._version = self._conn.execute('SELECT version FROM invalidations').fetchone()[0]
+        return len(dropped)
+
+    def most_requested(self, count: int, game: str = None):
+        """
+        Return the ``count`` most requested ``(game, item)`` keys, optionally only for one game.
+        """
+        with self._lock:
+            ranked = [key for key, _ in self.requests.most_common() if game is None or key[0] == game]
+        return ranked[:count]
+
+    def flush_requests(self):
+        """
+        Save the request counts to the on-disk tier so the most requested items are known after a restart.
+        """
+        with self._lock:
+            self._flush_requests()
+
+    def _flush_requests(self):
+        self._flushed = time.time()
+        if self._conn is None:
+            return
+        with self._conn:
+            self._conn.executemany('INSERT INTO properties (game, item, requests) VALUES (?, ?, ?) '
+                                   'ON CONFLICT (game, item) DO UPDATE SET requests = excluded.requests',
+                                   [(game, item, n) for (game, item), n in self.requests.items()])
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'max_entries': self.max_entries,
+                'on_disk': self._conn is not None}
@@ -0,0 +1,431 @@
+# charts.py
+
+# Chart rendering, run inside worker processes so the bot's event loop stays responsive
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from market import mid_price
+
+# numpy, matplotlib and Pillow (which matplotlib requires) are imported inside the render functions, so only the
+# worker processes load them
+
+# Chart widths in inches, drawn at CHART_DPI (so 640, 900 and 1200 pixels wide). Each chart keeps its aspect ratio
+CHART_SIZES = {'small': 8, 'medium': 11.25, 'large': 15}
+CHART_DPI = 80
+# Output formats and their file extensions: 'png8' is a PNG quantized to a 256 color palette and 'webp' is lossless
+CHART_FORMATS = {'png': 'png', 'png8': 'png', 'webp': 'webp'}
+# Fixed margins in inches, wide enough for the tick labels and titles, so no tight bounding box pass is needed
+MARGINS = {'left': 1.0, 'right': 0.3, 'bottom': 0.8, 'top': 0.45, 'gap': 1.1}
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised when a render is requested while ``RenderPool.max_pending`` jobs are already outstanding.
+    """
+
+
+class RenderPool:
+    """
+    Process pool for chart rendering with a cap on outstanding jobs.
+
+    The executor is created on the first render, so importing this module does not start any processes. Workers are
+    started as fresh interpreters (``spawn``) rather than forked, so they inherit neither the bot's threads nor its
+    memory. If a worker dies (ex. killed for using too much memory) the executor is broken for good, so it is
+    replaced on the next render.
+
+    Args:
+        workers (int): Number of worker processes.
+        max_pending (int): Maximum number of queued or running renders before new ones are rejected.
+
+    Attributes:
+        pending (int): Renders currently queued or running (the queue depth).
+        rendered (int): Renders completed since start.
+        rejected (int): Renders refused because the queue was full.
+        restarts (int): Executors replaced after a worker died.
+    """
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor = None
+
+    async def submit(self, func, *args):
+        """
+        Run ``func(*args)`` in a worker process and return its result.
+
+        Raises:
+            RenderQueueFull: ``max_pending`` renders are already outstanding.
+            BrokenProcessPool: A worker died during the render. The next render starts a new executor.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise RenderQueueFull(f'{self.pending} renders outstanding')
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        executor = self._executor
+
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Every render waiting on the broken executor fails with this, only the first one replaces it
+            if self._executor is executor:
+                logging.warning('A render worker died, restarting the render pool')
+                self._executor = None
+                self.restarts += 1
+                executor.shutdown(wait=False)
+            raise
+        finally:
+            self.pending -= 1
+        self.rendered += 1
+        logging.debug(f'Rendered {func.__name__}, {self.pending} renders outstanding')
+        return result
+
+    def stats(self):
+        return {'workers': self.workers, 'queue_depth': self.pending, 'max_pending': self.max_pending,
+                'rendered': self.rendered, 'rejected': self.rejected, 'restarts': self.restarts}
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+class Chart:
+    """
+    A rendered chart, as returned by the render functions.
+
+    Attributes:
+        image (bytes): The encoded image.
+        extension (str): File extension of ``image`` (``'png'`` or ``'webp'``).
+        draw_seconds (float): Time spent building and drawing the figure.
+        encode_seconds (float): Time spent compressing the pixels into ``image``.
+    """
+    __slots__ = ('image', 'extension', 'draw_seconds', 'encode_seconds')
+
+    def __init__(self, image: bytes, extension: str, draw_seconds: float, encode_seconds: float):
+        self.image = image
+        self.extension = extension
+        self.draw_seconds = draw_seconds
+        self.encode_seconds = encode_seconds
+
+
+def _figure(size: str, aspect: float, rows: int = 1):
+    """
+    Create a figure of the ``size`` preset, ``aspect`` times as high as it is wide, with ``rows`` panels placed at
+    fixed margins.
+    """
+    from matplotlib.figure import Figure
+
+    width = CHART_SIZES[size]
+    height = width * aspect
+    fig = Figure(figsize=(width, height), dpi=CHART_DPI)
+    panel = (height - MARGINS['bottom'] - MARGINS['top'] - MARGINS['gap'] * (rows - 1)) / rows
+    fig.subplots_adjust(left=MARGINS['left'] / width, right=1 - MARGINS['right'] / width,
+                        bottom=MARGINS['bottom'] / height, top=1 - MARGINS['top'] / height,
+                        hspace=MARGINS['gap'] / panel)
+    return fig, fig.subplots(nrows=rows)
+
+
+def _encode(fig, fmt: str, started: float):
+    """
+    Draw ``fig`` once and compress its pixels with Pillow into ``fmt``. WebP falls back to ``png8`` if Pillow was
+    built without it.
+
+    Args:
+        fig (matplotlib.figure.Figure): The chart.
+        fmt (str): One of ``CHART_FORMATS``.
+        started (float): ``time.perf_counter()`` when the render started, so the draw time includes building it.
+
+    Returns:
+        Chart: The image with its draw and encode times.
+    """
+    from PIL import Image, features
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    drawn = time.perf_counter()
+
+    image = Image.frombuffer('RGBA', canvas.get_width_height(), canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    image = image.convert('RGB')
+    if fmt == 'webp' and not features.check('webp'):
+        fmt = 'png8'
+    stream = io.BytesIO()
+    if fmt == 'webp':
+        image.save(stream, format='WEBP', lossless=True, quality=50, method=3)
+    elif fmt == 'png8':
+        image.quantize(256, method=Image.FASTOCTREE).save(stream, format='PNG', compress_level=6)
+    else:
+        image.save(stream, format='PNG', compress_level=6)
+
+    return Chart(stream.getvalue(), CHART_FORMATS[fmt], drawn - started, time.perf_counter() - drawn)
+
+
+def minmax_indices(values, buckets: int):
+    """
+    Pick the points to draw of a line denser than the ``buckets`` pixels it is drawn on: the lowest and highest
+    point of each of ``buckets`` equal slices, plus the first and last point. The line looks the same since every
+    spike is kept, but far fewer segments are drawn.
+
+    Args:
+        values (numpy.ndarray): The line's values, NaN for gaps.
+        buckets (int): Number of slices, usually the plot width in pixels.
+
+    Returns:
+        numpy.ndarray: Sorted indices into ``values``, all of them if there are at most ``2 * buckets`` points.
+    """
+    import numpy as np
+
+    size = len(values)
+    if size <= 2 * buckets:
+        return np.arange(size)
+    per = -(-size // buckets)
+    rows = np.full(per * -(-size // per), np.nan)
+    rows[:size] = values
+    rows = rows.reshape(-1, per)
+    finite = np.isfinite(rows)
+    first = np.arange(len(rows)) * per
+    lowest = first + np.where(finite, rows, np.inf).argmin(axis=1)
+    highest = first + np.where(finite, rows, -np.inf).argmax(axis=1)
+    return np.unique(np.concatenate(([0, size - 1], lowest[lowest < size], highest[highest < size])))
+
+
+def _plot_line(ax, timestamps, values, **kwargs):
+    indices = minmax_indices(values, int(ax.bbox.width))
+    ax.plot(timestamps[indices], values[indices], **kwargs)
+
+
+def _plot_volume(ax, timestamps, values, step: int, **kwargs):
+    """
+    Draw the volume bars as one filled step outline, which is much faster than ``ax.bar`` building and drawing a
+    rectangle per point. Series denser than the plot width are grouped to one bar per pixel, holding the group's
+    largest volume.
+    """
+    import numpy as np
+
+    per = max(1, -(-len(values) // max(1, int(ax.bbox.width))))
+    if per > 1:
+        rows = np.zeros(per * -(-len(values) // per))
+        rows[:len(values)] = values
+        rows = rows.reshape(-1, per)
+        # Low price volumes are negative, so their largest is the minimum
+        values = np.where(-rows.min(axis=1) > rows.max(axis=1), rows.min(axis=1), rows.max(axis=1))
+        timestamps = timestamps[::per]
+
+    edges = np.append(timestamps, timestamps[-1] + np.timedelta64(per * step, 's'))
+    ax.fill_between(edges, np.append(values, values[-1]), step='post', lw=0, **kwargs)
+
+
+def _date_axis(ax):
+    import matplotlib.dates as mdates
+
+    locator = mdates.AutoDateLocator()
+    formatter = mdates.ConciseDateFormatter(locator)
+    formatter.formats = ['%y',  # ticks are mostly years
+                         '%b %d',  # ticks are mostly months
+                         '%b %d',  # ticks are mostly days
+                         '%H:%M',  # hrs
+                         '%H:%M',  # min
+                         '', ]  # secs
+    # these are mostly just the level above...
+    formatter.zero_formats = [''] + formatter.formats[:-1]
+    # ...except for ticks that are mostly hours, then it is nice to have
+    # day-month:
+    formatter.zero_formats[3] = '%d-%b'
+
+    formatter.offset_formats = ['',
+                                '%Y',
+                                '%b %Y',
+                                '%d %b %Y',
+                                '%d %b %Y',
+                                '%d %b %Y %H:%M', ]
+
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(formatter)
+    ax.tick_params(axis='x', labelbottom=True, labelrotation=30)
+    ax.grid(True, color='0.4')
+
+
+def gap_fill(data, step: int):
+    """
+    Put a timeseries on a regular grid of ``step`` seconds between its first and last timestamp.
+
+    Missing prices are forward-filled (leading gaps stay NaN), missing volumes become 0 and the low price volume is
+    negated so it can be drawn below the axis. Points which are not on the grid are dropped.
+
+    Args:
+        data (numpy.ndarray): Array of shape ``(n, 5)`` with columns timestamp (unix seconds), avgHighPrice,
+            avgLowPrice, highPriceVolume and lowPriceVolume, sorted by timestamp. Missing values are NaN.
+        step (int): Seconds between points.
+
+    Returns:
+        tuple: ``(timestamps, high, low, high_volume, low_volume)``. Timestamps are ``datetime64[s]``, the rest
+        float64 arrays of the same length.
+    """
+    import numpy as np
+
+    timestamps = data[:, 0].astype(np.int64)
+    offsets = timestamps - timestamps[0]
+    on_grid = offsets % step == 0
+    positions = offsets[on_grid] // step
+    rows = data[on_grid]
+    size = int(positions[-1]) + 1 if len(positions) else 0
+
+    grid = (timestamps[0] + np.arange(size, dtype=np.int64) * step).astype('datetime64[s]')
+
+    prices = np.full((size, 2), np.nan)
+    prices[positions] = rows[:, 1:3]
+    # Forward fill: each row takes the values of the last row at or before it which has a price
+    for column in range(2):
+        filled = np.where(np.isnan(prices[:, column]), 0, np.arange(size))
+        np.maximum.accumulate(filled, out=filled)
+        prices[:, column] = prices[filled, column]
+
+    volumes = np.zeros((size, 2))
+    volumes[positions] = np.nan_to_num(rows[:, 3:5])
+    volumes[:, 1] *= -1
+
+    return grid, prices[:, 0], prices[:, 1], volumes[:, 0], volumes[:, 1]
+
+
+def render_timeseries(data, step: int, item_name: str, item_id: str, volume: bool, size: str = 'large',
+                      fmt: str = 'png8'):
+    """
+    Render the price (and optionally volume) history of an item.
+
+    Uses the object-oriented Figure/Agg API rather than pyplot, so no global state is shared between renders.
+
+    Args:
+        data (numpy.ndarray): The timeseries as accepted by ``gap_fill``.
+        step (int): Seconds between points of the timeseries.
+        item_name (str): Item name used in the titles.
+        item_id (str): Item ID used in the titles.
+        volume (bool): True to add a volume panel under the price panel.
+        size (str, optional): One of ``CHART_SIZES``. Default ``'large'``.
+        fmt (str, optional): One of ``CHART_FORMATS``. Default ``'png8'``.
+
+    Returns:
+        Chart: The encoded image.
+    """
+    import matplotlib.style as mplstyle
+
+    started = time.perf_counter()
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, step)
+
+    with mplstyle.context('dark_background'):
+        # More involved subplotting for price and volume data
+        if volume:
+            fig, axs = _figure(size, 2 / 3, rows=2)
+
+            _plot_line(axs[0], timestamps, high, label='High Price', color='#ffa333')
+            _plot_line(axs[0], timestamps, low, label='Low Price', color='#33ff5f')
+            axs[0].legend()
+            axs[0].set_title(f'Price - {item_name.capitalize()} - ID {item_id}')
+
+            _plot_volume(axs[1], timestamps, high_volume, step, label='High Price Volume', color='#ffa333')
+            _plot_volume(axs[1], timestamps, low_volume, step, label='Low Price Volume', color='#33ff5f')
+            axs[1].legend()
+            axs[1].set_title(f'Volume - {item_name.capitalize()} - ID {item_id}')
+
+            for ax in axs:
+                _date_axis(ax)
+                ax.set_xlim(left=timestamps[0], right=timestamps[-1])
+
+        else:
+            fig, ax = _figure(size, 1 / 3)
+            _plot_line(ax, timestamps, high, label='avgHighPrice', color='#ffa333')
+            _plot_line(ax, timestamps, low, label='avgLowPrice', color='#33ff5f')
+            ax.legend()
+            ax.set_xlabel('timestamp')
+            ax.set_ylabel('price')
+            ax.set_title(f'Price - {item_name.capitalize()} - ID {item_id}')
+            _date_axis(ax)
+            ax.set_xlim(left=timestamps[0], right=timestamps[-1])
+
+        return _encode(fig, fmt, started)
+
+
+def align_series(series: list, step: int):
+    """
+    Put the timeseries of several items on one shared time index spanning all of them.
+
+    Args:
+        series (list): Arrays as accepted by ``gap_fill``, one per item. Empty arrays give an all-NaN row.
+        step (int): Seconds between points.
+
+    Returns:
+        tuple: ``(timestamps, prices)``. Timestamps are ``datetime64[s]``, and ``prices`` a float64 array of shape
+        ``(len(series), len(timestamps))`` holding each item's mean of its forward-filled high and low prices, NaN
+        outside the item's own range.
+    """
+    import numpy as np
+
+    present = [data for data in series if len(data)]
+    if not present:
+        return np.array([], dtype='datetime64[s]'), np.full((len(series), 0), np.nan)
+    start = min(int(data[0, 0]) for data in present)
+    end = max(int(data[-1, 0]) for data in present)
+    size = (end - start) // step + 1
+
+    prices = np.full((len(series), size), np.nan)
+    for row, data in enumerate(series):
+        if not len(data):
+            continue
+        _, high, low, _, _ = gap_fill(data, step)
+        offset = (int(data[0, 0]) - start) // step
+        prices[row, offset:offset + len(high)] = mid_price(high, low)
+
+    timestamps = (start + np.arange(size, dtype=np.int64) * step).astype('datetime64[s]')
+    return timestamps, prices
+
+
+def render_comparison(series: list, step: int, item_names: list, size: str = 'large', fmt: str = 'png8'):
+    """
+    Render the prices of several items as one chart, each normalized to its percentage change since its first price
+    in the window so items of any value share the axis.
+
+    Args:
+        series (list): The timeseries of each item, as accepted by ``gap_fill``.
+        step (int): Seconds between points of the timeseries.
+        item_names (list): Item names for the legend, in the order of ``series``.
+        size (str, optional): One of ``CHART_SIZES``. Default ``'large'``.
+        fmt (str, optional): One of ``CHART_FORMATS``. Default ``'png8'``.
+
+    Returns:
+        Chart: The encoded image.
+    """
+    import numpy as np
+    import matplotlib.style as mplstyle
+
+    started = time.perf_counter()
+    timestamps, prices = align_series(series, step)
+
+    with mplstyle.context('dark_background'):
+        fig, ax = _figure(size, 7 / 15)
+        for name, row in zip(item_names, prices):
+            known = np.flatnonzero(np.isfinite(row))
+            if not len(known):
+                continue
+            change = 100 * (row / row[known[0]] - 1)
+            _plot_line(ax, timestamps, change, label=f'{name.capitalize()} ({change[known[-1]]:+.1f}%)')
+
+        ax.axhline(0, color='grey', lw=0.8)
+        ax.legend()
+        ax.set_ylabel('change (%)')
+        ax.set_title('Price Comparison')
+        _date_axis(ax)
+        if len(timestamps):
+            ax.set_xlim(left=timestamps[0], right=timestamps[-1])
+
+        return _encode(fig, fmt, started)
@@ -0,0 +1,93 @@
+# history.py
+
+# Local storage of price history, so repeated charts only fetch what is new
+import os
+import sqlite3
+import threading
+
+# Seconds covered by each point of the timeseries endpoint's timesteps
+TIMESTEP_SECONDS = {'5m': 300, '1h': 3600, '6h': 6 * 3600, '24h': 24 * 3600}
+
+_FIELDS = ('avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume')
+
+
+class PriceHistory:
+    """
+    SQLite store of ``TimeSeries`` points per item and timestep.
+
+    Points are appended as they are fetched, so the history of an item grows beyond the 365 points the API returns.
+    The newest stored timestamp of an item (its watermark) tells whether the wiki can have published anything new.
+    All methods are blocking and safe to call from worker threads.
+
+    Args:
+        path (str): The SQLite database file, created if missing.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS timeseries ('
+                               'item_id INTEGER NOT NULL, timestep TEXT NOT NULL, timestamp INTEGER NOT NULL, '
+                               'avgHighPrice INTEGER, avgLowPrice INTEGER, highPriceVolume INTEGER, '
+                               'lowPriceVolume INTEGER, PRIMARY KEY (item_id, timestep, timestamp)) WITHOUT ROWID')
+
+    def watermark(self, item_id: str, timestep: str):
+        """
+        Return the newest stored timestamp for the item and timestep, or None if nothing is stored.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT MAX(timestamp) FROM timeseries WHERE item_id = ? AND timestep = ?',
+                                     (int(item_id), timestep)).fetchone()
+        return row[0]
+
+    def needs_fetch(self, item_id: str, timestep: str, now: float):
+        """
+        True if the wiki may have published points newer than the watermark. A point is stamped with the start of
+        its window, so the one after the watermark cannot exist before two timesteps have passed.
+        """
+        watermark = self.watermark(item_id, timestep)
+        return watermark is None or now >= watermark + 2 * TIMESTEP_SECONDS[timestep]
+
+    def append(self, item_id: str, timestep: str, points: list):
+        """
+        Store the points of a ``TimeSeries`` response which are not older than the watermark. The watermark point
+        itself is rewritten in case the wiki revised it.
+
+        Returns:
+            int: Number of points written.
+        """
+        watermark = self.watermark(item_id, timestep)
+        rows = [(int(item_id), timestep, p['timestamp']) + tuple(p.get(f) for f in _FIELDS)
+                for p in points if watermark is None or p['timestamp'] >= watermark]
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO timeseries VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def _rows(self, item_id: str, timestep: str, limit: int):
+        with self._lock:
+            rows = self._conn.execute('SELECT timestamp, avgHighPrice, avgLowPrice, highPriceVolume, lowPriceVolume '
+                                      'FROM timeseries WHERE item_id = ? AND timestep = ? '
+                                      'ORDER BY timestamp DESC LIMIT ?', (int(item_id), timestep, limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    def read(self, item_id: str, timestep: str, limit: int = 365):
+        """
+        Return the newest ``limit`` points in ``TimeSeries`` content format, oldest first.
+        """
+        return [dict(zip(('timestamp',) + _FIELDS, row)) for row in self._rows(item_id, timestep, limit)]
+
+    def read_array(self, item_id: str, timestep: str, limit: int = 365):
+        """
+        Return the newest ``limit`` points, oldest first, as a float64 array of shape ``(n, 5)`` with columns
+        timestamp, avgHighPrice, avgLowPrice, highPriceVolume and lowPriceVolume. Missing values are NaN.
+        """
+        import numpy as np
+
+        return np.array(self._rows(item_id, timestep, limit), dtype=np.float64).reshape(-1, 5)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,326 @@
+# items.py
+
+# Item name lookups over the OSRS item mapping, and its on-disk copy
+import hashlib
+import json
+import os
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain
+
+
+def load_mapping_file(path: str):
+    """
+    Read a mapping saved by ``save_mapping_file``.
+
+    Returns:
+        tuple: ``(content, etag, digest)``, or ``(None, None, None)`` if the file is missing or unreadable.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            content = json.loads(f.read())
+    except (OSError, ValueError):
+        return None, None, None
+    return content, header.get('etag'), header.get('sha256')
+
+
+def save_mapping_file(path: str, body: bytes, etag: str = None):
+    """
+    Save the raw ``Mapping`` response body behind a one-line JSON header holding its ETag and SHA-256 digest. The file
+    is written next to ``path`` and renamed over it, so readers never see a partial file.
+
+    Returns:
+        str: The SHA-256 hex digest of ``body``.
+    """
+    digest = mapping_digest(body)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(json.dumps({'etag': etag, 'sha256': digest}).encode() + b'\n')
+        f.write(body)
+    os.replace(temp_path, path)
+    return digest
+
+
+def mapping_digest(body: bytes):
+    return hashlib.sha256(body).hexdigest()
+
+
+def build_item_map(mapping: list):
+    """
+    Build the ``item_map`` lookup: every mapping dict keyed by both its ID (as a string) and its exact name.
+    """
+    item_map = {}
+    for d in mapping:
+        item_map[str(d['id'])] = d
+        item_map[d['name']] = d
+    return item_map
+
+
+class ItemMeta:
+    """
+    The static parts of an item's embeds, built once per mapping instead of on every response.
+
+    Attributes:
+        id (str): The item ID.
+        name (str): The item name.
+        icon (str): The icon file name as used in wiki image URLs (ex. ``'Coal_5.png'``).
+        prices_url (str): The item's page on the real-time prices site.
+        icon_url (str): The icon on the OSRS wiki.
+    """
+    __slots__ = ('id', 'name', 'icon', 'prices_url', 'icon_url')
+
+    def __init__(self, item: dict):
+        self.id = str(item['id'])
+        self.name = item['name']
+        self.icon = item.get('icon', '').replace(' ', '_')
+        self.prices_url = 'https://prices.runescape.wiki/osrs/item/' + self.id
+        self.icon_url = 'https://oldschool.runescape.wiki/images/' + self.icon
+
+
+def build_item_meta(mapping: list):
+    """
+    Build an ``ItemMeta`` for every item of a ``Mapping``, keyed by both its ID (as a string) and its exact name like
+    ``item_map``.
+    """
+    item_meta = {}
+    for d in mapping:
+        meta = ItemMeta(d)
+        item_meta[meta.id] = meta
+        item_meta[meta.name] = meta
+    return item_meta
+
+
+def load_aliases(path: str):
+    """
+    Read a JSON object of alias to item name (ex. ``{"dbones": "Dragon bones"}``).
+
+    Returns:
+        dict: Lowercase alias to item name, empty if the file is missing or unreadable.
+    """
+    try:
+        with open(path) as f:
+            return {alias.strip().lower(): name for alias, name in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def edit_distance(a: str, b: str, bound: int):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions) between ``a`` and ``b``, computed
+    only within ``bound`` of the diagonal.
+
+    Returns:
+        int: The distance, or ``bound + 1`` if it is larger than ``bound``.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    # Only the differing middle needs the matrix, most typos leave a few characters of it
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return min(len(a) + len(b), bound + 1)
+
+    over = bound + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        current[0] = row_min = i
+        char = a[i - 1]
+        for j in range(max(1, i - bound), min(len(b), i + bound) + 1):
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] < value:
+                value = previous[j] + 1
+            if current[j - 1] < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1] and before[j - 2] < value:
+                value = before[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > bound:
+            return over
+        before, previous = previous, current
+    return previous[-1] if previous[-1] < over else over
+
+
+# Names up to this long are also matched through their deletion variants, not only the 3-grams they share
+SHORT_NAME = 6
+
+
+def _normalize(text: str):
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+def _grams(text: str, n: int):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _deletions(text: str, depth: int):
+    # The text itself and every string left by deleting up to depth of its characters
+    variants = {text}
+    for _ in range(depth):
+        variants |= {variant[:i] + variant[i + 1:] for variant in variants for i in range(len(variant))}
+    return variants
+
+
+class ItemIndex:
+    """
+    Case-insensitive index over the item names of a ``Mapping`` for exact, prefix and substring lookups.
+
+    Names are kept in a sorted array of lowercase names, so prefix lookups are two bisections. Substring lookups
+    intersect the posting lists of an n-gram inverted index (1- to 3-grams) and only check the surviving candidates.
+    Misspelled names are resolved with a second 3-gram index bucketed by name length: only names whose length is
+    within the edit bound are counted, and the ones sharing the most 3-grams are ranked by edit distance. Short names
+    have too few 3-grams for a typo to leave one intact (ex. ``'caol'``), so they are also indexed by every variant
+    with up to 2 characters deleted: two names within 2 edits always share one.
+
+    Args:
+        mapping (list): The ``Mapping`` content, a list of dicts with at least ``id`` and ``name``.
+        aliases (dict, optional): Lowercase alias to item name, as returned by ``load_aliases``.
+
+    Attributes:
+        items (list): The mapping dicts, sorted by lowercase name. Lookups return entries of this list.
+    """
+    def __init__(self, mapping: list, aliases: dict = None):
+        self.items = sorted(mapping, key=lambda d: d['name'].lower())
+        self._names = [d['name'].lower() for d in self.items]
+        self._exact = {}
+        self._grams = defaultdict(set)
+        self._fuzzy = defaultdict(lambda: defaultdict(list))
+        self._deletes = defaultdict(list)
+
+        for position, (d, name) in enumerate(zip(self.items, self._names)):
+            self._exact[str(d['id'])] = d
+            self._exact.setdefault(name, d)
+            for n in (1, 2, 3):
+                for gram in _grams(name, n):
+                    self._grams[gram].add(position)
+            for gram in _grams(name, 3):
+                self._fuzzy[len(name)][gram].append(position)
+            if len(name) <= SHORT_NAME + 2:
+                for variant in _deletions(name, 2):
+                    self._deletes[variant].append(position)
+        self._fuzzy = {length: dict(postings) for length, postings in self._fuzzy.items()}
+        self._deletes = dict(self._deletes)
+
+        for alias, name in (aliases or {}).items():
+            match = self._exact.get(name.lower())
+            if match is not None:
+                self._exact.setdefault(alias, match)
+
+    def __len__(self):
+        return len(self.items)
+
+    def exact(self, value: str):
+        """
+        Return the mapping dict whose ID or name (any casing) equals ``value``, or None.
+        """
+        return self._exact.get(_normalize(value))
+
+    def resolve(self, text: str, suggestions: int = 3):
+        """
+        Resolve an item ID, name or alias, correcting misspelled names. The closest name is accepted if it is within
+        1 edit for names up to 4 characters, 2 up to 9 and 3 beyond, and no other name is as close.
+
+        Returns:
+            tuple: ``(item, names)``, ``item`` being the mapping dict or None, and ``names`` up to ``suggestions``
+            close item names when it is None.
+        """
+        text = _normalize(text)
+        match = self._exact.get(text)
+        if match is not None:
+            return match, []
+        if not text or text.isnumeric():
+            return None, []
+
+        bound = 1 if len(text) <= 4 else 2 if len(text) <= 9 else 3
+        reach = bound + 2
+        grams = _grams(text, 3) or {text}
+        buckets = [self._fuzzy[length] for length in range(len(text) - reach, len(text) + reach + 1)
+                   if length in self._fuzzy]
+        shared = Counter(chain.from_iterable(bucket.get(gram, ()) for bucket in buckets for gram in grams))
+
+        names = self._names
+        candidates = sorted((p for p, _ in shared.most_common(40)),
+                            key=lambda p: (-shared[p], abs(len(names[p]) - len(text)), p))[:20]
+        if len(text) <= SHORT_NAME:
+            close = chain.from_iterable(self._deletes.get(variant, ()) for variant in _deletions(text, bound))
+            candidates = list(dict.fromkeys(chain(candidates, close)))
+
+        # Each name only has to beat the closest one so far, which lets most of them stop after a few rows
+        best, ties = None, 0
+        for position in candidates:
+            distance = edit_distance(text, names[position], bound)
+            if distance > bound:
+                continue
+            if best is None or distance < best[0]:
+                best, ties, bound = (distance, position), 0, distance
+            else:
+                ties += 1
+        if best is not None and not ties:
+            return self.items[best[1]], []
+
+        scored = sorted((edit_distance(text, names[position], reach), -shared[position], position)
+                        for position in candidates)
+        return None, [self.items[position]['name'] for distance, _, position in scored[:suggestions]
+                      if distance <= reach]
+
+    def prefix(self, text: str, limit: int = None):
+        """
+        Return the mapping dicts whose name starts with ``text`` (any casing), in alphabetical order.
+        """
+        text = text.lower()
+        start = bisect_left(self._names, text)
+        end = bisect_left(self._names, text + '￿', lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.items[start:end]
+
+    def search(self, text: str, limit: int = None):
+        """
+        Return the mapping dicts whose name contains ``text`` (any casing), in alphabetical order.
+        """
+        text = text.lower()
+        if not text:
+            return self.items[:limit]
+
+        n = min(3, len(text))
+        postings = sorted((self._grams.get(gram, set()) for gram in _grams(text, n)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+
+        results = []
+        for position in sorted(candidates):
+            if text in self._names[position]:
+                results.append(self.items[position])
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def complete(self, text: str, limit: int = 25):
+        """
+        Autocomplete suggestions for ``text``: names starting with it first, then names containing it.
+
+        Returns:
+            list: Up to ``limit`` item names.
+        """
+        names = [d['name'] for d in self.prefix(text, limit)]
+        if len(names) < limit:
+            seen = set(names)
+            for d in self.search(text):
+                if d['name'] not in seen:
+                    names.append(d['name'])
+                    if len(names) >= limit:
+                        break
+        if not names and len(text) >= 3:
+            match, names = self.resolve(text, limit)
+            if match is not None:
+                names = [match['name']]
+        return names
@@ -0,0 +1,148 @@
+# market.py
+
+# Whole-market views of the all-items price snapshots
+
+
+def snapshot_arrays(snapshot: dict, fields: tuple, size: int = None):
+    """
+    Parse an all-items snapshot (``Latest`` or ``AvgPrice`` content) into aligned arrays indexed by item ID.
+
+    Args:
+        snapshot (dict): Item ID (str) to a dict of values, as returned by the prices API.
+        fields (tuple): The value names to extract (ex. ``('high', 'low')``).
+        size (int, optional): Length of the arrays. Default is one more than the largest item ID in the snapshot.
+
+    Returns:
+        dict: Field name to a float64 array where ``array[item_id]`` is the item's value, NaN if it is missing.
+    """
+    import numpy as np
+
+    ids = np.fromiter((int(k) for k in snapshot), dtype=np.int64, count=len(snapshot))
+    if size is None:
+        size = int(ids.max()) + 1 if len(ids) else 0
+    keep = ids < size
+
+    arrays = {}
+    for field in fields:
+        values = np.array([entry.get(field) for entry in snapshot.values()], dtype=np.float64)
+        array = np.full(size, np.nan)
+        array[ids[keep]] = values[keep]
+        arrays[field] = array
+    return arrays
+
+
+def mapping_arrays(mapping: list, fields: tuple = ('limit',)):
+    """
+    Parse ``Mapping`` content into arrays indexed by item ID, aligned with ``snapshot_arrays(..., size=len(...))``.
+
+    Returns:
+        dict: Field name to a float64 array (NaN for IDs without the field), plus ``'listed'``, a boolean array which
+        is True for the IDs in the mapping.
+    """
+    import numpy as np
+
+    ids = np.fromiter((d['id'] for d in mapping), dtype=np.int64, count=len(mapping))
+    size = int(ids.max()) + 1 if len(ids) else 0
+
+    arrays = {'listed': np.zeros(size, dtype=bool)}
+    arrays['listed'][ids] = True
+    for field in fields:
+        array = np.full(size, np.nan)
+        array[ids] = np.array([d.get(field) for d in mapping], dtype=np.float64)
+        arrays[field] = array
+    return arrays
+
+
+def mid_price(high, low):
+    """
+    Mean of the high and low prices, or whichever one is known. NaN where both are missing.
+    """
+    import numpy as np
+
+    return np.where(np.isnan(high), low, np.where(np.isnan(low), high, (high + low) / 2))
+
+
+def rank(scores, count: int, descending: bool = True):
+    """
+    Return the indices (item IDs) of the ``count`` best finite ``scores``, best first.
+
+    Only the top ``count`` are selected (``argpartition``) before sorting, so the cost stays linear in the number of
+    items.
+    """
+    import numpy as np
+
+    candidates = np.flatnonzero(np.isfinite(scores))
+    values = -scores[candidates] if descending else scores[candidates]
+    if count < len(candidates):
+        top = np.argpartition(values, count)[:count]
+        candidates, values = candidates[top], values[top]
+    return candidates[np.argsort(values, kind='stable')]
+
+
+def _value(array, i):
+    value = array[i]
+    return None if value != value else float(value)
+
+
+def scan_margins(latest: dict, mapping: dict, sort: str, count: int, min_price: float = 0, oldest: float = None):
+    """
+    Rank items by their current margin (instant buy minus instant sell price).
+
+    Args:
+        latest (dict): ``Latest`` arrays from ``snapshot_arrays`` with ``high``, ``low``, ``highTime`` and ``lowTime``.
+        mapping (dict): Arrays from ``mapping_arrays`` with ``limit``, the same size as ``latest``.
+        sort (str): ``'margin'``, ``'roi'`` (margin as a percentage of the sell price) or ``'potential'`` (margin
+            times the buy limit).
+        count (int): How many items to return.
+        min_price (float, optional): Skip items whose sell price is lower. Default 0.
+        oldest (float, optional): Skip items whose buy or sell price is from before this Unix time. Default None.
+
+    Returns:
+        list: ``(item_id, high, low, margin, roi, limit)`` tuples, best first. Missing values are None.
+    """
+    import numpy as np
+
+    high, low = latest['high'], latest['low']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        usable = mapping['listed'] & (low >= min_price)
+        if oldest is not None:
+            usable &= (latest['highTime'] >= oldest) & (latest['lowTime'] >= oldest)
+        margin = np.where(usable, high - low, np.nan)
+        roi = 100 * margin / low
+        scores = {'margin': margin, 'roi': roi, 'potential': margin * mapping['limit']}[sort]
+
+    return [(i, _value(high, i), _value(low, i), _value(margin, i), _value(roi, i), _value(mapping['limit'], i))
+            for i in rank(scores, count).tolist()]
+
+
+def scan_movers(recent: dict, hourly: dict, mapping: dict, sort: str, count: int, min_volume: float = 0):
+    """
+    Rank items by the change of their 5m average price against the 1h average, or by their 1h trade volume.
+
+    Args:
+        recent (dict): ``AvgPrice('5m')`` arrays from ``snapshot_arrays``.
+        hourly (dict): ``AvgPrice('1h')`` arrays from ``snapshot_arrays``.
+        mapping (dict): Arrays from ``mapping_arrays``, the same size as the snapshots.
+        sort (str): ``'gainers'``, ``'losers'`` or ``'volume'``.
+        count (int): How many items to return.
+        min_volume (float, optional): Skip items with fewer trades in the last hour. Default 0.
+
+    Returns:
+        list: ``(item_id, recent_price, hourly_price, change, volume)`` tuples, best first, the prices being the mean
+        of the average buy and sell prices and ``change`` a percentage. Missing values are None.
+    """
+    import numpy as np
+
+    recent_price = mid_price(recent['avgHighPrice'], recent['avgLowPrice'])
+    hourly_price = mid_price(hourly['avgHighPrice'], hourly['avgLowPrice'])
+    volume = np.nan_to_num(hourly['highPriceVolume']) + np.nan_to_num(hourly['lowPriceVolume'])
+    usable = mapping['listed'] & (volume >= min_volume)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = np.where(usable, 100 * (recent_price - hourly_price) / hourly_price, np.nan)
+
+    if sort == 'volume':
+        ranked = rank(np.where(usable, volume, np.nan), count)
+    else:
+        ranked = rank(change, count, descending=sort == 'gainers')
+    return [(i, _value(recent_price, i), _value(hourly_price, i), _value(change, i), _value(volume, i))
+            for i in ranked.tolist()]
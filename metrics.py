@@ -0,0 +1,196 @@
+# metrics.py
+
+# Latency histograms for the slash commands and a Prometheus-style text export
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed ``BUCKETS``, as exported by Prometheus clients.
+    """
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in (the largest finite bound for the last one).
+        """
+        if not self.count:
+            return 0.0
+        running = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            running += count
+            if running >= q * self.count:
+                return bound if bound != float('inf') else BUCKETS[-2]
+        return BUCKETS[-2]
+
+
+class Metrics:
+    """
+    Timing spans per slash command and stage (ex. fetch, transform, render, respond), plus gauges collected from the
+    ``stats()`` of caches and pools.
+
+    Args:
+        prefix (str, optional): Prefix of the exported metric names. Default ``'rswiki'``.
+    """
+    def __init__(self, prefix: str = 'rswiki'):
+        self.prefix = prefix
+        self.histograms = {}
+        self.collectors = {}
+
+    def observe(self, command: str, stage: str, seconds: float):
+        histogram = self.histograms.get((command, stage))
+        if histogram is None:
+            histogram = self.histograms[(command, stage)] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, command: str, stage: str):
+        """
+        Time the enclosed block (which may await) as ``stage`` of ``command``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(command, stage, time.perf_counter() - start)
+
+    def add_collector(self, name: str, func):
+        """
+        Export the numeric values of the dict returned by ``func()`` as gauges named ``<prefix>_<name>_<key>``.
+        """
+        self.collectors[name] = func
+
+    def gauges(self):
+        values = {}
+        for name, func in self.collectors.items():
+            for key, value in func().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[f'{self.prefix}_{name}_{key}'] = value
+        return values
+
+    def prometheus(self):
+        """
+        Render every histogram and gauge in the Prometheus text exposition format.
+        """
+        name = f'{self.prefix}_command_seconds'
+        lines = [f'# HELP {name} Slash command latency by stage', f'# TYPE {name} histogram']
+        for (command, stage), histogram in sorted(self.histograms.items()):
+            labels = f'command="{command}",stage="{stage}"'
+            running = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                running += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {running}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+        for gauge, value in sorted(self.gauges().items()):
+            lines.append(f'# TYPE {gauge} gauge')
+            lines.append(f'{gauge} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        Return ``(command, stage, count, mean_ms, p50_ms, p99_ms)`` rows for every histogram.
+        """
+        rows = []
+        for (command, stage), h in sorted(self.histograms.items()):
+            rows.append((command, stage, h.count, 1000 * h.sum / h.count if h.count else 0.0,
+                         1000 * h.quantile(0.5), 1000 * h.quantile(0.99)))
+        return rows
+
+    async def serve(self, host: str, port: int):
+        """
+        Serve ``prometheus()`` at ``http://host:port/metrics``.
+
+        Returns:
+            aiohttp.web.AppRunner: The runner, to be cleaned up on shutdown.
+        """
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.prometheus(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f'Serving metrics on http://{host}:{port}/metrics')
+        return runner
+
+
+class Profiler:
+    """
+    Samples single command invocations with cProfile. Only one invocation is profiled at a time, because cProfile
+    records everything running on the event loop thread while it is enabled.
+
+    Args:
+        directory (str): Where the ``.pstats`` files of finished samples are written.
+
+    Attributes:
+        remaining (int): Invocations still to be sampled.
+        command (str): Only sample this command, or any command if None.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.remaining = 0
+        self.command = None
+        self._active = None
+
+    def arm(self, count: int, command: str = None):
+        self.remaining = count
+        self.command = command
+
+    def start(self, key, command: str):
+        """
+        Start profiling the invocation ``key`` if samples are wanted for ``command`` and none is running.
+        """
+        if self.remaining <= 0 or self._active is not None or (self.command and command != self.command):
+            return
+        self.remaining -= 1
+        profile = cProfile.Profile()
+        self._active = (key, command, profile)
+        profile.enable()
+
+    def stop(self, key):
+        """
+        Stop profiling the invocation ``key`` if it is the one being sampled, and save and log the results.
+
+        Returns:
+            str: Path of the saved ``.pstats`` file, or None if ``key`` was not being profiled.
+        """
+        if self._active is None or self._active[0] != key:
+            return None
+        _, command, profile = self._active
+        profile.disable()
+        self._active = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{command}-{int(time.time())}.pstats')
+        profile.dump_stats(path)
+
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(20)
+        logging.info(f'Profile of /{command} saved to {path}\n{report.getvalue()}')
+        return path
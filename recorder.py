@@ -0,0 +1,169 @@
+# recorder.py
+
+# Archive of every all-items AvgPrice snapshot, kept because the wiki only serves recent windows in bulk
+import os
+import threading
+import time
+
+# numpy is imported where it is used, so the bot starts without it when the recorder is off
+
+# Record layout: every value is an unsigned 32-bit integer, missing prices and volumes are stored as 0
+RECORD_FIELDS = ('timestamp', 'item_id', 'avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume')
+# Index layout: one entry per snapshot, pointing at its block of records in the day's data file
+INDEX_FIELDS = (('timestamp', '<u8'), ('offset', '<u8'), ('count', '<u4'))
+
+
+def _dtypes():
+    import numpy as np
+
+    return (np.dtype([(name, '<u4') for name in RECORD_FIELDS]), np.dtype(list(INDEX_FIELDS)))
+
+
+class SnapshotArchive:
+    """
+    Append-only binary archive of ``AvgPrice`` snapshots, one pair of files per route and UTC day.
+
+    ``<route>/<YYYY-MM-DD>.bin`` holds fixed-width records (24 bytes per item per snapshot), written one snapshot at a
+    time and sorted by item ID within each snapshot. ``<route>/<YYYY-MM-DD>.idx`` holds one entry per snapshot
+    (timestamp, first record, record count). Reads memory-map the data files and binary search each snapshot's
+    block, so slicing one item out of a day only touches a few pages. All methods are blocking and safe to call
+    from worker threads.
+
+    Args:
+        directory (str): Where the route directories are created.
+
+    Attributes:
+        written (int): Records appended since start.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.written = 0
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def _path(self, route: str, day: str, suffix: str):
+        return os.path.join(self.directory, route, day + suffix)
+
+    @staticmethod
+    def _day(timestamp: int):
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+    def _index(self, route: str, day: str):
+        import numpy as np
+
+        _, index_dtype = _dtypes()
+        try:
+            return np.fromfile(self._path(route, day, '.idx'), dtype=index_dtype)
+        except FileNotFoundError:
+            return None
+
+    def days(self, route: str):
+        """
+        Return the UTC days (``'YYYY-MM-DD'``) with recorded snapshots of ``route``, oldest first.
+        """
+        try:
+            names = os.listdir(os.path.join(self.directory, route))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-4] for name in names if name.endswith('.idx'))
+
+    def last_timestamp(self, route: str):
+        """
+        Return the timestamp of the newest recorded snapshot of ``route``, or None.
+        """
+        if route not in self._last:
+            days = self.days(route)
+            index = self._index(route, days[-1]) if days else None
+            self._last[route] = int(index['timestamp'][-1]) if index is not None and len(index) else None
+        return self._last[route]
+
+    def append(self, route: str, timestamp: int, snapshot: dict):
+        """
+        Record the ``AvgPrice`` content of the window starting at ``timestamp``. Snapshots not newer than the last
+        recorded one are ignored.
+
+        Returns:
+            int: Number of records written.
+        """
+        import numpy as np
+
+        record_dtype, index_dtype = _dtypes()
+        with self._lock:
+            last = self.last_timestamp(route)
+            if not snapshot or (last is not None and timestamp <= last):
+                return 0
+
+            records = np.zeros(len(snapshot), dtype=record_dtype)
+            records['timestamp'] = timestamp
+            records['item_id'] = np.fromiter((int(k) for k in snapshot), dtype=np.uint32, count=len(snapshot))
+            for field in RECORD_FIELDS[2:]:
+                records[field] = [entry.get(field) or 0 for entry in snapshot.values()]
+            records.sort(order='item_id')
+
+            day = self._day(timestamp)
+            os.makedirs(os.path.join(self.directory, route), exist_ok=True)
+            index = self._index(route, day)
+            offset = int(index['offset'][-1] + index['count'][-1]) if index is not None and len(index) else 0
+
+            # The data is written before the index entry, and anything past the indexed records (left by a write
+            # which was interrupted) is cut off first, so the index never points at incomplete records. A partly
+            # written index entry is cut off the same way, so the new one is not misaligned behind it
+            with open(self._path(route, day, '.bin'), 'ab') as f:
+                f.truncate(offset * record_dtype.itemsize)
+                f.write(records.tobytes())
+            entry = np.array([(timestamp, offset, len(records))], dtype=index_dtype)
+            with open(self._path(route, day, '.idx'), 'ab') as f:
+                f.truncate((len(index) if index is not None else 0) * index_dtype.itemsize)
+                f.write(entry.tobytes())
+
+            self._last[route] = timestamp
+            self.written += len(records)
+        return len(records)
+
+    def read(self, route: str, item_id: int, start: int = 0, end: int = None):
+        """
+        Return the records of one item from the snapshots with ``start <= timestamp < end``, oldest first, as a numpy
+        structured array with ``RECORD_FIELDS``.
+        """
+        import numpy as np
+
+        record_dtype, _ = _dtypes()
+        item_id = int(item_id)
+        end = end if end is not None else 2 ** 32
+        first, last = self._day(start), self._day(min(end, 2 ** 32 - 1))
+
+        found = []
+        for day in self.days(route):
+            if not first <= day <= last:
+                continue
+            index = self._index(route, day)
+            index = index[(index['timestamp'] >= start) & (index['timestamp'] < end)]
+            if not len(index):
+                continue
+            # Only the indexed records are mapped: an append in progress or an interrupted one can leave a partial
+            # record past them, and the file would then not be a whole number of records
+            data = np.memmap(self._path(route, day, '.bin'), dtype=record_dtype, mode='r',
+                             shape=(int((index['offset'] + index['count']).max()),))
+            for offset, count in zip(index['offset'].tolist(), index['count'].tolist()):
+                ids = data['item_id'][offset:offset + count]
+                position = int(np.searchsorted(ids, item_id))
+                if position < count and ids[position] == item_id:
+                    found.append(data[offset + position])
+        return np.array(found, dtype=record_dtype)
+
+    def read_array(self, route: str, item_id: int, start: int = 0, end: int = None):
+        """
+        Like ``read`` but in the format of ``PriceHistory.read_array``: a float64 array of shape ``(n, 5)`` with
+        columns timestamp, avgHighPrice, avgLowPrice, highPriceVolume and lowPriceVolume. Missing prices are NaN.
+        """
+        import numpy as np
+
+        records = self.read(route, item_id, start, end)
+        array = np.column_stack([records[field].astype(np.float64) for field in
+                                 ('timestamp',) + RECORD_FIELDS[2:]]).reshape(-1, 5)
+        prices = array[:, 1:3]
+        prices[prices == 0] = np.nan
+        return array
+
+    def stats(self):
+        return {'written': self.written}
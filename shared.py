@@ -0,0 +1,130 @@
+# shared.py
+
+# Coordination between bot processes sharing one data directory in sharded mode
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def _try_lock(path: str):
+    """
+    Take an exclusive ``flock`` on ``path`` without waiting. The lock lasts as long as the returned file stays open,
+    and the kernel releases it when the process exits, however it exits.
+
+    Returns:
+        The open lock file, or None if another process holds the lock.
+    """
+    f = open(path, 'a+')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def claim_slot(directory: str, count: int):
+    """
+    Claim the first free shard slot out of ``count``, so processes started from the same image (ex. scaled compose
+    replicas) each run a different shard without being configured one by one.
+
+    Returns:
+        tuple: ``(slot, lock_file)``. Keep ``lock_file`` open for as long as the slot is in use.
+
+    Raises:
+        RuntimeError: Every slot is held by another process.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for slot in range(count):
+        lock_file = _try_lock(os.path.join(directory, f'shard-{slot}.lock'))
+        if lock_file is not None:
+            return slot, lock_file
+    raise RuntimeError(f'All {count} shard slots in {directory} are taken')
+
+
+class LeaderLock:
+    """
+    Elects the one process which polls the wiki. Whoever holds the lock file is the leader, and when it exits the
+    lock is freed for the next process to call ``acquire()``.
+
+    Args:
+        path (str): The lock file, created if missing.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """
+        Try to become the leader without waiting. Returns True if this process is the leader.
+        """
+        if self._file is None:
+            self._file = _try_lock(self.path)
+        return self._file is not None
+
+
+class SharedSnapshots:
+    """
+    SQLite table of the latest price snapshots, written by the leader and read by the other processes. Reads are
+    recorded, so the leader can tell which snapshots anyone still uses. All methods are blocking and safe to call
+    from worker threads.
+
+    Args:
+        path (str): The SQLite database file, created if missing.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS snapshots (endpoint TEXT NOT NULL, route TEXT NOT NULL, '
+                               'fetched REAL NOT NULL, content TEXT NOT NULL, PRIMARY KEY (endpoint, route))')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS reads (endpoint TEXT NOT NULL, route TEXT NOT NULL, '
+                               'read REAL NOT NULL, PRIMARY KEY (endpoint, route))')
+
+    def publish(self, endpoint: str, route: str, content, fetched: float = None):
+        """
+        Replace the published snapshot, ``fetched`` being the Unix time it was fetched at (default now).
+        """
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)',
+                               (endpoint, route, time.time() if fetched is None else fetched, json.dumps(content)))
+
+    def load(self, endpoint: str, route: str):
+        """
+        Return ``(fetched, content)`` of the published snapshot, ``fetched`` being its Unix time, or None. The read is
+        recorded for ``wanted``.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO reads VALUES (?, ?, ?)', (endpoint, route, time.time()))
+            row = self._conn.execute('SELECT fetched, content FROM snapshots WHERE endpoint = ? AND route = ?',
+                                     (endpoint, route)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def wanted(self, endpoint: str, route: str):
+        """
+        Return True if the snapshot was read since it was last published, or read and never published.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT reads.read, snapshots.fetched FROM reads LEFT JOIN snapshots '
+                                     'USING (endpoint, route) WHERE endpoint = ? AND route = ?',
+                                     (endpoint, route)).fetchone()
+        return row is not None and (row[1] is None or row[0] >= row[1])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,63 @@
+# startup.py
+
+# Cold start timing: how long each top-level import, loading the data and connecting to Discord take
+import builtins
+import sys
+import time
+
+
+class StartupTimer:
+    """
+    Times the import of every top-level package between ``install()`` and ``uninstall()``, and named milestones
+    since the timer was created.
+
+    Only the outermost import is timed, so a package's time includes the packages it pulls in which were not loaded
+    yet, and a package already imported by an earlier one costs nothing.
+
+    Attributes:
+        imports (dict): Top-level package name to seconds spent importing it.
+        marks (dict): Milestone name to seconds since the timer was created.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}
+        self.marks = {}
+        self._import = None
+        self._depth = 0
+
+    def install(self):
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top = name.partition('.')[0]
+        if self._depth or level or top in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            self.imports[top] = self.imports.get(top, 0.0) + time.perf_counter() - start
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter() - self.started
+
+    def stats(self):
+        return {f'{name}_seconds': round(seconds, 3) for name, seconds in self.marks.items()}
+
+    def report(self, limit: int = 15):
+        """
+        Return a multi-line report of the milestones and the ``limit`` slowest imports.
+        """
+        lines = ['Startup: ' + ', '.join(f'{name} after {seconds:.2f}s' for name, seconds in self.marks.items())]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:limit]
+        lines += [f'  import {name:<20} {1000 * seconds:8.1f} ms' for name, seconds in slowest]
+        return '\n'.join(lines)
@@ -0,0 +1,89 @@
+# tests/test_alerts.py
+
+# WatchList.evaluate against hand-built Latest price arrays
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from alerts import WatchList  # noqa: E402
+
+NAN = np.nan
+
+
+@pytest.fixture
+def watches(tmp_path):
+    watch_list = WatchList(str(tmp_path / 'watches.sqlite3'))
+    yield watch_list
+    watch_list.close()
+
+
+def prices(**values):
+    # Latest arrays indexed by item ID for items 0-9, values given as item=(high, low)
+    high, low = np.full(10, NAN), np.full(10, NAN)
+    for item, (item_high, item_low) in values.items():
+        high[int(item[1:])], low[int(item[1:])] = item_high, item_low
+    return high, low
+
+
+def fired_ids(fired):
+    return sorted((row['id'], price) for row, price in fired)
+
+
+def test_buy_watches_high_and_sell_watches_low(watches):
+    buy = watches.add(1, '4', 'buy', True, 100)
+    sell = watches.add(1, '4', 'sell', True, 100)
+
+    # Only the sell (low) price is at the threshold
+    assert fired_ids(watches.evaluate(*prices(i4=(90, 100)))) == [(sell, 100)]
+    assert fired_ids(watches.evaluate(*prices(i4=(100, 90)))) == [(buy, 100)]
+
+
+def test_above_and_below(watches):
+    above = watches.add(1, '2', 'buy', True, 50)
+    below = watches.add(2, '2', 'buy', False, 40)
+
+    assert watches.evaluate(*prices(i2=(45, 45))) == []
+    assert fired_ids(watches.evaluate(*prices(i2=(40, 40)))) == [(below, 40)]
+    assert fired_ids(watches.evaluate(*prices(i2=(51, 51)))) == [(above, 51)]
+
+
+def test_fired_alerts_are_deleted(watches):
+    fired = watches.add(1, '3', 'buy', True, 10)
+    kept = watches.add(1, '5', 'buy', True, 10)
+
+    result = watches.evaluate(*prices(i3=(20, 20), i5=(5, 5)))
+    assert fired_ids(result) == [(fired, 20)]
+    assert result[0][0]['user_id'] == 1
+    assert [row['id'] for row in watches.for_user(1)] == [kept]
+    assert watches.evaluate(*prices(i3=(20, 20), i5=(5, 5))) == []
+
+
+def test_unknown_prices_never_fire(watches):
+    watches.add(1, '6', 'buy', False, 10)
+    watches.add(1, '600', 'buy', False, 10)
+
+    assert watches.evaluate(*prices(i6=(NAN, 5))) == []
+    assert len(watches) == 2
+
+
+def test_restore_keeps_the_alert_and_its_id(watches):
+    watch_id = watches.add(1, '4', 'sell', False, 30, channel_id=99)
+    (row, _), = watches.evaluate(*prices(i4=(40, 25)))
+    assert len(watches) == 0
+
+    watches.restore([row])
+    restored, = watches.for_user(1)
+    assert (restored['id'], restored['channel_id'], restored['threshold']) == (watch_id, 99, 30)
+    assert fired_ids(watches.evaluate(*prices(i4=(40, 25)))) == [(watch_id, 25)]
+
+
+def test_changes_from_another_process_are_picked_up(watches, tmp_path):
+    other = WatchList(str(tmp_path / 'watches.sqlite3'))
+    assert watches.evaluate(*prices(i1=(10, 10))) == []
+
+    watch_id = other.add(1, '1', 'buy', True, 5)
+    assert fired_ids(watches.evaluate(*prices(i1=(10, 10)))) == [(watch_id, 10)]
+    other.close()
@@ -0,0 +1,85 @@
+# tests/test_cache.py
+
+# PropertyCache expiry, invalidation across processes sharing a file and persisted request counts
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import cache  # noqa: E402
+from cache import PropertyCache  # noqa: E402
+
+TTL = 100
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'properties.sqlite3')
+
+
+def test_memory_tier_expires(clock):
+    properties = PropertyCache(max_entries=10, ttl=TTL)
+    properties.put('osrs', 'Coal', {'value': 45})
+
+    clock[0] += TTL - 1
+    assert properties.get('osrs', 'Coal') == {'value': 45}
+    clock[0] += 2
+    assert properties.get('osrs', 'Coal') is None
+    assert (properties.hits, properties.misses) == (1, 1)
+
+
+def test_disk_tier_expires(clock, path):
+    PropertyCache(max_entries=10, ttl=TTL, path=path).put('osrs', 'Coal', {'value': 45})
+
+    clock[0] += TTL - 1
+    reopened = PropertyCache(max_entries=10, ttl=TTL, path=path)
+    assert reopened.get('osrs', 'Coal') == {'value': 45}
+    assert reopened.disk_hits == 1
+
+    clock[0] += 2
+    assert reopened.get('osrs', 'Coal') is None
+    assert PropertyCache(max_entries=10, ttl=TTL, path=path).get('osrs', 'Coal') is None
+
+
+def test_invalidation_reaches_other_instances(clock, path):
+    first = PropertyCache(max_entries=10, ttl=TTL, path=path)
+    second = PropertyCache(max_entries=10, ttl=TTL, path=path)
+    first.put('osrs', 'Coal', {'value': 45})
+    first.put('rs3', 'Coal', {'value': 120})
+    assert second.get('osrs', 'Coal') == {'value': 45}
+    assert second.get('rs3', 'Coal') == {'value': 120}
+
+    assert first.invalidate('osrs', 'Coal') == 1
+    # second held the entry in memory, it has to notice the invalidation to drop it
+    assert second.get('osrs', 'Coal') is None
+    assert second.get('rs3', 'Coal') == {'value': 120}
+    assert first.get('rs3', 'Coal') == {'value': 120}
+    assert first.hits == 1
+
+
+def test_request_counts_survive_a_reopen(clock, path):
+    properties = PropertyCache(max_entries=10, ttl=TTL, path=path, flush_interval=60)
+    for _ in range(3):
+        properties.get('osrs', 'Coal')
+    properties.get('osrs', 'Iron ore')
+    properties.get('osrs', 'Iron ore', count=False)
+    assert PropertyCache(max_entries=10, ttl=TTL, path=path).requests == {}
+
+    # The next counted lookup after flush_interval saves every count
+    clock[0] += 60
+    properties.get('rs3', 'Coal')
+    reopened = PropertyCache(max_entries=10, ttl=TTL, path=path)
+    assert reopened.requests == {('osrs', 'Coal'): 3, ('osrs', 'Iron ore'): 1, ('rs3', 'Coal'): 1}
+    assert reopened.most_requested(1, 'osrs') == [('osrs', 'Coal')]
+
+    properties.get('osrs', 'Iron ore')
+    properties.flush_requests()
+    assert PropertyCache(max_entries=10, ttl=TTL, path=path).requests[('osrs', 'Iron ore')] == 2
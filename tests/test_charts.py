@@ -0,0 +1,70 @@
+# tests/test_charts.py
+
+# gap_fill against expected arrays written out by hand
+import os
+import sys
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from charts import gap_fill  # noqa: E402
+
+NAN = np.nan
+
+
+def grid(*timestamps):
+    return np.array(timestamps, dtype='datetime64[s]')
+
+
+def test_leading_gap_stays_nan():
+    data = np.array([[600, NAN, 10, 1, 2],
+                     [900, 20, NAN, 3, 4],
+                     [1200, NAN, NAN, 5, 6],
+                     [1500, 21, 11, 7, 8]])
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, 300)
+
+    assert_array_equal(timestamps, grid(600, 900, 1200, 1500))
+    assert_array_equal(high, [NAN, 20, 20, 21])
+    assert_array_equal(low, [10, 10, 10, 11])
+    assert_array_equal(high_volume, [1, 3, 5, 7])
+    assert_array_equal(low_volume, [-2, -4, -6, -8])
+
+
+def test_single_point():
+    data = np.array([[3600, 105, 99, 12, 30]])
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, 3600)
+
+    assert_array_equal(timestamps, grid(3600))
+    assert_array_equal(high, [105])
+    assert_array_equal(low, [99])
+    assert_array_equal(high_volume, [12])
+    assert_array_equal(low_volume, [-30])
+
+
+def test_missing_intervals_are_filled():
+    data = np.array([[0, 100, 90, 4, 5],
+                     [900, 110, 95, 6, 7],
+                     [1200, 120, NAN, 8, 9]])
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, 300)
+
+    assert_array_equal(timestamps, grid(0, 300, 600, 900, 1200))
+    assert_array_equal(high, [100, 100, 100, 110, 120])
+    assert_array_equal(low, [90, 90, 90, 95, 95])
+    assert_array_equal(high_volume, [4, 0, 0, 6, 8])
+    assert_array_equal(low_volume, [-5, 0, 0, -7, -9])
+
+
+def test_low_volume_negated_and_missing_volume_zero():
+    data = np.array([[0, 10, 9, NAN, 3],
+                     [300, 11, 8, 2, NAN],
+                     [450, 50, 50, 50, 50],
+                     [600, 12, 7, 0, 1]])
+    timestamps, high, low, high_volume, low_volume = gap_fill(data, 300)
+
+    # The point at 450 is between grid points, so it is dropped
+    assert_array_equal(timestamps, grid(0, 300, 600))
+    assert_array_equal(high, [10, 11, 12])
+    assert_array_equal(low, [9, 8, 7])
+    assert_array_equal(high_volume, [0, 2, 0])
+    assert_array_equal(low_volume, [-3, 0, -1])
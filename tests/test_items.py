@@ -0,0 +1,157 @@
+# tests/test_items.py
+
+# ItemIndex lookups and the edit distance behind misspelled names
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from items import ItemIndex, edit_distance  # noqa: E402
+
+MAPPING = [{'id': 453, 'name': 'Coal'}, {'id': 2353, 'name': 'Steel bar'}, {'id': 449, 'name': 'Adamantite ore'},
+           {'id': 536, 'name': 'Dragon bones'}, {'id': 1333, 'name': 'Rune scimitar'}, {'id': 2363, 'name': 'Rune bar'},
+           {'id': 7001, 'name': 'Rune bag'}, {'id': 4, 'name': 'Cannonball'}]
+
+
+def osa_distance(a: str, b: str):
+    # Optimal string alignment over the full matrix, the reference for the banded version
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return ItemIndex(MAPPING, aliases={'dbones': 'Dragon bones', 'scim': 'rune SCIMITAR', 'ghost': 'No such item'})
+
+
+def names(index, text):
+    match, suggestions = index.resolve(text)
+    return match and match['name'], suggestions
+
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('coal', 'coal', 0),
+    ('coal', 'coat', 1),
+    ('coal', 'cal', 1),
+    ('coal', 'coals', 1),
+    ('coal', 'caol', 1),
+    ('rune scimitar', 'rnue scimiatr', 2),
+    ('ca', 'abc', 3),
+    ('', 'abc', 3),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 5) == distance
+    assert edit_distance(b, a, 5) == distance
+
+
+def test_edit_distance_stops_at_the_bound():
+    assert edit_distance('coal', 'iron ore', 2) == 3
+    assert edit_distance('abcdef', 'badcfe', 2) == 3
+    assert edit_distance('abcdef', 'badcfe', 3) == 3
+
+
+def test_edit_distance_matches_the_full_matrix():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 9)))
+        b = ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 9)))
+        bound = rng.randint(0, 4)
+        assert edit_distance(a, b, bound) == min(osa_distance(a, b), bound + 1), (a, b, bound)
+
+
+def test_exact_ids_and_names(index):
+    assert names(index, '453') == ('Coal', [])
+    assert names(index, '  STEEL   Bar ') == ('Steel bar', [])
+    assert names(index, 'rune bar') == ('Rune bar', [])
+
+
+def test_numeric_input_is_never_corrected(index):
+    assert index.resolve('454') == (None, [])
+    assert index.resolve('99999') == (None, [])
+
+
+def test_aliases(index):
+    assert names(index, 'DBones') == ('Dragon bones', [])
+    assert names(index, 'scim') == ('Rune scimitar', [])
+    # An alias of a name missing from the mapping is not added
+    assert index.exact('ghost') is None
+
+
+def test_transpositions_count_as_one_edit(index):
+    assert names(index, 'Caol') == ('Coal', [])
+    assert names(index, 'rnue scimiatr') == ('Rune scimitar', [])
+    assert names(index, 'dragon bnoes') == ('Dragon bones', [])
+
+
+def test_edit_bound_grows_with_the_length(index):
+    # Up to 4 characters: 1 edit
+    assert names(index, 'coax') == ('Coal', [])
+    assert names(index, 'oalx') == (None, ['Coal'])
+    # 5 to 9 characters: 2 edits
+    assert names(index, 'coaxx') == ('Coal', [])
+    assert names(index, 'stxxl bar') == ('Steel bar', [])
+    assert names(index, 'stxxl bxr')[0] is None
+    assert 'Steel bar' in names(index, 'stxxl bxr')[1]
+    # 10 characters and more: 3 edits
+    assert names(index, 'axamantxtx ore') == ('Adamantite ore', [])
+    assert names(index, 'cannxnbxlx') == ('Cannonball', [])
+    assert names(index, 'cannxnbxxx') == (None, ['Cannonball'])
+
+
+def test_equally_close_names_are_suggested_not_picked(index):
+    match, suggestions = index.resolve('rune baz')
+    assert match is None
+    assert sorted(suggestions) == ['Rune bag', 'Rune bar']
+
+
+def test_nothing_close(index):
+    assert index.resolve('zzzzzzzz') == (None, [])
+    assert index.resolve('   ') == (None, [])
+
+
+@pytest.fixture(scope='module')
+def scanned():
+    rng = random.Random(1)
+    words = ['rune', 'Rune', 'adamant', 'dragon', 'bones', 'Coal', 'ore', 'bar', 'a', 'b', 'ab', 'potion(4)', "d'hide"]
+    # Item names are unique in the mapping
+    names = {' '.join(rng.choice(words) for _ in range(rng.randint(1, 3))).capitalize() for _ in range(600)}
+    mapping = [{'id': i, 'name': name} for i, name in enumerate(sorted(names))]
+    return ItemIndex(mapping), sorted(mapping, key=lambda d: d['name'].lower())
+
+
+# 1, 2 and 3+ character queries in mixed case, some matching nothing
+QUERIES = ['', 'r', 'R', 'z', "'", 'ru', 'RU', 'ne', 'e ', 'zz', 'rune', 'RuNe B', 'bones', 'on b', '(4)',
+           'dragon dragon', 'xyz', 'a', 'ab', 'AB a']
+
+
+@pytest.mark.parametrize('text', QUERIES)
+def test_prefix_matches_a_scan(scanned, text):
+    index, items = scanned
+    expected = [d for d in items if d['name'].lower().startswith(text.lower())]
+    assert index.prefix(text) == expected
+    assert index.prefix(text, 5) == expected[:5]
+
+
+@pytest.mark.parametrize('text', QUERIES)
+def test_search_matches_a_scan(scanned, text):
+    index, items = scanned
+    expected = [d for d in items if text.lower() in d['name'].lower()]
+    assert index.search(text) == expected
+    assert index.search(text, 5) == expected[:5]
+
+
+@pytest.mark.parametrize('text', QUERIES)
+def test_complete_lists_prefix_matches_first(scanned, text):
+    index, items = scanned
+    starts = [d['name'] for d in items if d['name'].lower().startswith(text.lower())]
+    contains = [d['name'] for d in items if text.lower() in d['name'].lower() and d['name'] not in starts]
+    expected = list(dict.fromkeys(starts + contains))[:25]
+    if expected:
+        assert index.complete(text) == expected
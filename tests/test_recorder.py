@@ -0,0 +1,60 @@
+# tests/test_recorder.py
+
+# SnapshotArchive reads and appends around partly written files
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from recorder import SnapshotArchive  # noqa: E402
+
+START = 1700000100
+SNAPSHOT = {'4': {'avgHighPrice': 150, 'avgLowPrice': 140, 'highPriceVolume': 7, 'lowPriceVolume': 3},
+            '2': {'avgHighPrice': 10, 'avgLowPrice': None, 'highPriceVolume': 1, 'lowPriceVolume': 0}}
+
+
+def files(directory, suffix):
+    return glob.glob(os.path.join(directory, '5m', '*' + suffix))[0]
+
+
+def test_read_returns_each_snapshot_of_an_item(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    assert archive.append('5m', START, SNAPSHOT) == 2
+    assert archive.append('5m', START + 300, SNAPSHOT) == 2
+    assert archive.append('5m', START, SNAPSHOT) == 0
+
+    records = archive.read('5m', 4)
+    assert records['timestamp'].tolist() == [START, START + 300]
+    assert records['avgHighPrice'].tolist() == [150, 150]
+    assert archive.read('5m', 2)['avgLowPrice'].tolist() == [0, 0]
+    assert archive.read('5m', 3).tolist() == []
+
+
+def test_read_ignores_a_record_cut_off_mid_write(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.append('5m', START, SNAPSHOT)
+    archive.append('5m', START + 300, SNAPSHOT)
+    data = files(str(tmp_path), '.bin')
+    # Cut the last record short, as an interrupted write or a read racing an append would find it
+    with open(data, 'r+b') as f:
+        f.truncate(os.path.getsize(data) - 10)
+    with open(files(str(tmp_path), '.idx'), 'r+b') as f:
+        f.truncate(20)
+
+    assert archive.read('5m', 4)['timestamp'].tolist() == [START]
+    assert archive.read_array('5m', 2).shape == (1, 5)
+
+
+def test_append_after_partial_writes(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    archive.append('5m', START, SNAPSHOT)
+    with open(files(str(tmp_path), '.bin'), 'ab') as f:
+        f.write(b'\x07' * 9)
+    with open(files(str(tmp_path), '.idx'), 'ab') as f:
+        f.write(b'\x07' * 5)
+
+    reopened = SnapshotArchive(str(tmp_path))
+    assert reopened.read('5m', 4)['timestamp'].tolist() == [START]
+    reopened.append('5m', START + 300, SNAPSHOT)
+    assert reopened.read('5m', 4)['timestamp'].tolist() == [START, START + 300]
+    assert os.path.getsize(files(str(tmp_path), '.idx')) == 2 * 20
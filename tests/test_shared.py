@@ -0,0 +1,53 @@
+# tests/test_shared.py
+
+# SharedSnapshots publishing, and the reads that tell the leader which snapshots to keep fresh
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import shared  # noqa: E402
+from shared import SharedSnapshots  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(shared.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / 'snapshots.sqlite3')
+    leader, follower = SharedSnapshots(path), SharedSnapshots(path)
+    yield leader, follower
+    leader.close()
+    follower.close()
+
+
+def test_published_snapshots_are_loaded(stores):
+    leader, follower = stores
+    assert follower.load('osrs', 'latest') is None
+    leader.publish('osrs', 'latest', {'data': {'4': {'high': 150}}}, 1234.5)
+    assert follower.load('osrs', 'latest') == (1234.5, {'data': {'4': {'high': 150}}})
+
+
+def test_only_snapshots_read_since_the_last_publish_are_wanted(stores, clock):
+    leader, follower = stores
+    assert not leader.wanted('osrs', 'latest')
+
+    # Read before anything was published
+    follower.load('osrs', 'latest')
+    assert leader.wanted('osrs', 'latest')
+
+    clock[0] += 1
+    leader.publish('osrs', 'latest', {}, clock[0])
+    assert not leader.wanted('osrs', 'latest')
+
+    clock[0] += 1
+    follower.load('osrs', 'latest')
+    assert leader.wanted('osrs', 'latest')
+    assert not leader.wanted('osrs', '5m')
+    assert not leader.wanted('rs', 'latest')
@@ -0,0 +1,319 @@
+# wikiapi.py
+
+# Async access to the RSWiki APIs, so slash command handlers never block the Discord event loop
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Base URLs can be pointed at a local stub server for testing
+PRICES_API = os.getenv('PRICES_API', 'https://prices.runescape.wiki/api/v1/')
+MEDIAWIKI_API = {
+    'osrs': os.getenv('OSRS_WIKI_API', 'https://oldschool.runescape.wiki/api.php'),
+    'rs3': os.getenv('RS3_WIKI_API', 'https://runescape.wiki/api.php'),
+}
+
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+HTTP_CONCURRENCY = int(os.getenv('HTTP_CONCURRENCY', '8'))
+# Requests per second and burst allowed per host (0 disables limiting), and retries of 429 and 5xx responses
+HTTP_RATE = float(os.getenv('HTTP_RATE', '10'))
+HTTP_BURST = int(os.getenv('HTTP_BURST', '20'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', '30'))
+
+# Statuses worth retrying, and the longest wait before a retry (including one asked for by Retry-After)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_MAX_BACKOFF = 60.0
+
+
+class WikiError(Exception):
+    """
+    Raised when a wiki API request fails, times out or returns a non-200 status.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate to one host. Requests wait for a token rather than being refused.
+
+    Args:
+        rate (float): Tokens added per second. Zero or less disables limiting.
+        burst (int): Most tokens held, so the most requests sent back to back after a quiet period.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Hold back every request for ``seconds``, ex. when the host answered 429 Too Many Requests.
+        """
+        self.not_before = max(self.not_before, time.monotonic() + seconds)
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.not_before:
+                    await asyncio.sleep(self.not_before - now)
+                    continue
+                if self.rate <= 0:
+                    break
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        self.waited += time.monotonic() - start
+
+
+def _retry_delay(response, attempt: int):
+    """
+    Seconds to wait before retrying ``response``: its Retry-After (in seconds or as an HTTP date) if it has one,
+    otherwise exponential backoff with jitter.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(_MAX_BACKOFF, max(0.0, delay))
+    return min(_MAX_BACKOFF, 0.5 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _prefetched_mediawiki(game: str, response: dict, user_agent: str):
+    """
+    Build a ``MediaWiki`` whose ``browse()`` uses an already downloaded response, so the wrapper's property parsing can
+    be reused without it making its own blocking request. rswiki_wrapper (and the requests library it uses) is only
+    imported once properties are first looked up.
+    """
+    global _PrefetchedMediaWiki
+    if _PrefetchedMediaWiki is None:
+        from rswiki_wrapper import MediaWiki
+
+        class _PrefetchedMediaWiki(MediaWiki):
+            def __init__(self, game, response, user_agent):
+                super().__init__(game, user_agent=user_agent)
+                self._prefetched = response
+
+            def browse(self, result_format: str = 'json', format_version: str = 'latest', **kwargs) -> None:
+                self.json = self._prefetched
+
+    return _PrefetchedMediaWiki(game, response, user_agent)
+
+
+_PrefetchedMediaWiki = None
+
+
+class WikiClient:
+    """
+    Shared aiohttp client for the real-time prices API and the MediaWiki API.
+
+    All requests go through one session whose connections are pooled and kept alive, with a per-request timeout and
+    at most ``max_concurrency`` requests in flight at once. Each host has its own ``TokenBucket``, 429 and 5xx
+    responses are retried with backoff, and identical requests made while one is in flight share its response.
+
+    Args:
+        user_agent (str): The user agent string sent with every request.
+        timeout (float, optional): Total seconds allowed per request. Default ``HTTP_TIMEOUT``.
+        max_concurrency (int, optional): Maximum simultaneous requests. Default ``HTTP_CONCURRENCY``.
+        rate (float, optional): Requests per second allowed per host. Default ``HTTP_RATE``.
+        burst (int, optional): Requests allowed back to back per host. Default ``HTTP_BURST``.
+        retries (int, optional): Retries of a 429 or 5xx response. Default ``HTTP_RETRIES``.
+    """
+    def __init__(self, user_agent: str, timeout: float = HTTP_TIMEOUT, max_concurrency: int = HTTP_CONCURRENCY,
+                 rate: float = HTTP_RATE, burst: int = HTTP_BURST, retries: int = HTTP_RETRIES):
+        self.headers = {'User-Agent': user_agent}
+        self.user_agent = user_agent
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.requests = 0
+        self.coalesced = 0
+        self.retried = 0
+        self._session = None
+        self._semaphore = None
+        self._buckets = {}
+        self._inflight = {}
+
+    def _get_session(self):
+        # The session has to be created inside the running loop, so it is built on first use
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=HTTP_KEEPALIVE,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout, connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._buckets = {}
+        return self._session
+
+    def _bucket(self, url: str):
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def get_raw(self, url: str, headers: dict = None, **params):
+        """
+        GET ``url`` with ``params`` and return the response without decoding it. If the same request is already in
+        flight, its response is shared instead of sending another.
+
+        Returns:
+            tuple: ``(status, headers, body)``. Status is 200, or 304 when ``headers`` made the request conditional.
+
+        Raises:
+            WikiError: The request failed, timed out or returned any other status, including a 429 or 5xx after
+                every retry.
+        """
+        key = (url, tuple(sorted(params.items())), tuple(sorted((headers or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(url, headers, params))
+            self._inflight[key] = task
+
+            def done(_):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                # Retrieve the exception in case every caller was cancelled, so it is not logged as unhandled
+                if not task.cancelled():
+                    task.exception()
+            task.add_done_callback(done)
+        else:
+            self.coalesced += 1
+        # A cancelled caller must not cancel the request the other callers are waiting for
+        return await asyncio.shield(task)
+
+    async def _request(self, url: str, headers: dict, params: dict):
+        session = self._get_session()
+        bucket = self._bucket(url)
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            self.requests += 1
+            try:
+                async with self._semaphore:
+                    async with session.get(url, params=params, headers=headers) as response:
+                        if response.status in (200, 304):
+                            return response.status, response.headers, await response.read()
+                        if response.status not in _RETRY_STATUSES or attempt == self.retries:
+                            raise WikiError(f'{url} returned HTTP {response.status}')
+                        delay = _retry_delay(response, attempt)
+                        if response.status == 429:
+                            bucket.pause(delay)
+            except asyncio.TimeoutError as e:
+                raise WikiError(f'{url} timed out') from e
+            except aiohttp.ClientError as e:
+                raise WikiError(f'{url} failed: {e}') from e
+
+            self.retried += 1
+            logging.warning(f'{url} returned HTTP {response.status}, retrying in {delay:.1f}s')
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {'requests': self.requests, 'coalesced': self.coalesced, 'retried': self.retried,
+                'in_flight': len(self._inflight),
+                'throttled_seconds': sum(bucket.waited for bucket in self._buckets.values())}
+
+    async def get_json(self, url: str, **params):
+        """
+        GET ``url`` with ``params`` and return the decoded JSON body.
+
+        Raises:
+            WikiError: The request failed, timed out, returned a non-200 status or a body which is not JSON.
+        """
+        _, _, body = await self.get_raw(url, **params)
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise WikiError(f'{url} returned invalid JSON') from e
+
+    async def prices(self, route: str, game: str = 'osrs', **params):
+        """
+        Query a route of the real-time prices API (``'latest'``, ``'mapping'``, ``'5m'``, ``'1h'``,
+        ``'timeseries'``) and return the raw JSON.
+        """
+        return await self.get_json(PRICES_API + game + '/' + route, **params)
+
+    async def latest(self, game: str = 'osrs'):
+        """
+        Equivalent of ``Latest(...).content``: a dict of item ID to latest high/low prices.
+        """
+        return (await self.prices('latest', game))['data']
+
+    async def average(self, route: str, game: str = 'osrs'):
+        """
+        Equivalent of ``AvgPrice(route, ...).content``: a dict of item ID to average prices and volumes.
+        """
+        return (await self.prices(route, game))['data']
+
+    async def timeseries(self, item_id: str, timestep: str, game: str = 'osrs'):
+        """
+        Equivalent of ``TimeSeries(id=item_id, timestep=timestep, ...).content``: a list of up to 365 points.
+        """
+        return (await self.prices('timeseries', game, id=item_id, timestep=timestep))['data']
+
+    async def mapping(self, game: str = 'osrs', etag: str = None):
+        """
+        Fetch the raw ``Mapping`` response, a JSON list of dicts describing every tradeable item.
+
+        Args:
+            etag (str, optional): ETag of the copy already held. If the wiki reports it unchanged, nothing is
+                downloaded.
+
+        Returns:
+            tuple: ``(etag, body)`` of the response, or ``(etag, None)`` if the held copy is still current.
+        """
+        headers = {'If-None-Match': etag} if etag else None
+        status, response_headers, body = await self.get_raw(PRICES_API + game + '/mapping', headers=headers)
+        if status == 304:
+            return etag, None
+        return response_headers.get('ETag'), body
+
+    async def browse_properties(self, game: str, item: str):
+        """
+        Equivalent of ``MediaWiki(game).browse_properties(item)`` followed by ``_clean_properties()``.
+
+        Returns:
+            dict: The property names and values for the item page.
+        """
+        browse_subject = '{"subject":"' + item.replace(" ", "_") + '","ns":0,"iw":"","subobject":"","options":{' \
+                                                                   '"dir":null,"lang":"en-gb","group":null,' \
+                                                                   '"printable":null,"offset":null,"including":false,' \
+                                                                   '"showInverse":false,"showAll":true,' \
+                                                                   '"showGroup":true,"showSort":false,"api":true,' \
+                                                                   '"valuelistlimit.out":"30",' \
+                                                                   '"valuelistlimit.in":"20"}} '
+        response = await self.get_json(MEDIAWIKI_API[game], action='smwbrowse', format='json',
+                                       formatversion='latest', browse='subject', params=browse_subject)
+
+        properties = _prefetched_mediawiki(game, response, self.user_agent)
+        try:
+            properties.browse_properties(item)
+        except (KeyError, TypeError) as e:
+            raise WikiError(f'Unexpected smwbrowse response for {item}') from e
+        properties._clean_properties()
+        logging.debug(f'Browsed {len(properties.content)} properties for {item} ({game})')
+        return properties.content
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -1,5 +1,10 @@
 # wikibot.py
 
+# Cold start timing, installed before the other imports so it can time them
+from startup import StartupTimer
+startup = StartupTimer()
+startup.install()
+
 # Imports for pycord
 import discord
 from discord import option
@@ -9,19 +14,30 @@ import os
 import dotenv
 
 # Imports for data
-from rswiki_wrapper import Latest, TimeSeries, AvgPrice, Mapping, MediaWiki
 from datetime import datetime
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import asyncio
 import io
+import json
+import time
 from urllib.parse import quote
+from cache import SnapshotCache, LRUCache, PropertyCache
+from wikiapi import WikiClient, WikiError
+from charts import CHART_FORMATS, CHART_SIZES, RenderPool, RenderQueueFull, render_timeseries, render_comparison
+from history import PriceHistory, TIMESTEP_SECONDS
+from alerts import WatchList, FIELDS as WATCH_FIELDS
+from market import snapshot_arrays, mapping_arrays, scan_margins, scan_movers
+from metrics import Metrics, Profiler
+from items import (ItemIndex, build_item_map, build_item_meta, load_aliases, load_mapping_file, save_mapping_file,
+                   mapping_digest)
+from shared import claim_slot, LeaderLock, SharedSnapshots
+from recorder import SnapshotArchive
 
 # Helper imports
 import logging
 
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(name)s: %(message)s', level=logging.INFO)
+startup.mark('imports')
+startup.uninstall()
 logging.info('Loading environment')
 
 dotenv.load_dotenv()
@@ -31,35 +47,650 @@ if user_agent is None:
     user_agent = 'RSWiki Bot Default'
     logging.info('Using default user_agent')
 
-item_mapping = Mapping(user_agent=user_agent)
-item_map = {}
-for d in item_mapping.content:
-    item_map[str(d['id'])] = d
-    item_map[d['name']] = d
-
-logging.info('Done loading, syncing commands')
+data_dir = os.getenv('DATA_DIR', 'data')
+
+# Everything that reads or opens files in data_dir is left to setup(), run by main(): importing wikibot (as the
+# render workers do) only reads the settings
+
+# The item mapping is loaded from the last saved copy and refreshed from the wiki in the background once connected
+mapping_file = os.path.join(data_dir, 'mapping.json')
+mapping_refresh = int(os.getenv('MAPPING_REFRESH', 6 * 3600))
+# Optional JSON object of extra names for items (ex. {"dbones": "Dragon bones"}), read once at startup
+aliases_file = os.getenv('ITEM_ALIASES', os.path.join(data_dir, 'aliases.json'))
+item_aliases = {}
+item_mapping, mapping_etag, mapping_sha256 = [], None, None
+item_map = build_item_map(item_mapping)
+item_meta = build_item_meta(item_mapping)
+item_index = ItemIndex(item_mapping)
+mapping_task = None
+
+# All wiki requests made by the commands go through one shared async client
+wiki = WikiClient(user_agent)
+
+# Charts are drawn in worker processes, with a cap on how many can be waiting at once
+render_pool = RenderPool(workers=int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1)),
+                         max_pending=int(os.getenv('RENDER_MAX_PENDING', '16')))
+
+# Chart size preset (small, medium or large) unless a command asks for another, and output format: png8 (a PNG with
+# a 256 color palette, under half the size of png and smaller than the charts before the fixed layout), png or webp
+# (lossless)
+chart_size = os.getenv('CHART_SIZE', 'large')
+if chart_size not in CHART_SIZES:
+    logging.warning(f'Unknown CHART_SIZE {chart_size}, using large')
+    chart_size = 'large'
+chart_format = os.getenv('CHART_FORMAT', 'png8')
+if chart_format not in CHART_FORMATS:
+    logging.warning(f'Unknown CHART_FORMAT {chart_format}, using png8')
+    chart_format = 'png8'
+elif chart_format == 'webp':
+    from PIL import features
+    if not features.check('webp'):
+        logging.warning('Pillow was built without WebP support, using png8')
+        chart_format = 'png8'
+chart_extension = CHART_FORMATS[chart_format]
+chart_output = {'charts': 0, 'bytes': 0, 'draw_seconds': 0.0, 'encode_seconds': 0.0}
+
+# Rendered charts, keyed so a chart is only redrawn once new data points arrive
+chart_cache = LRUCache(max_bytes=int(os.getenv('CHART_CACHE_BYTES', 64 * 1024 * 1024)))
+
+# Price history already fetched for /timeseries, so each chart only needs the points newer than what is stored
+price_history = None
+history_max_points = int(os.getenv('HISTORY_MAX_POINTS', '2000'))
+
+# Item properties hardly ever change, so lookups are cached for a long time in memory and on disk
+property_cache = None
+property_prefetch = int(os.getenv('PROPERTY_PREFETCH', '0'))
+property_prefetch_task = None
+
+# Bot owners and these user IDs can use the /admin commands
+admin_ids = {int(i) for i in os.getenv('ADMIN_IDS', '').split(',') if i.strip()}
+
+# Optional archive of every 5m and 1h AvgPrice window, recorded by the leader. On startup it catches up on up to
+# recorder_backfill missed windows per route
+snapshot_archive = None
+recorder_backfill = int(os.getenv('RECORDER_BACKFILL', '12'))
+recorder_task = None
+
+# Price alerts, checked against every Latest snapshot by one background poller
+watch_list = None
+watch_poll_interval = int(os.getenv('WATCH_POLL_INTERVAL', '60'))
+watch_max_per_user = int(os.getenv('WATCH_MAX_PER_USER', '25'))
+# Alerts whose delivery keeps failing are retried on later cycles, then dropped after this many attempts
+watch_delivery_attempts = int(os.getenv('WATCH_DELIVERY_ATTEMPTS', '5'))
+watch_failures = {}
+watch_task = None
+
+# Multi-item responses: at most max_items items per request, tables split every table_rows_per_embed rows
+max_items = int(os.getenv('MAX_ITEMS', '50'))
+table_rows_per_embed = 30
+compare_max_items = int(os.getenv('COMPARE_MAX_ITEMS', '8'))
+
+# The wiki refreshes /latest about every minute and the averages at the end of each window
+snapshot_cache = SnapshotCache(ttls={'latest': 60, '5m': 300, '1h': 3600})
+
+# Snapshots parsed into numpy arrays indexed by item ID for the market scans, reparsed when the snapshot or the
+# mapping changes. Margins ignore prices older than margin_max_age seconds
+market_fields = {'latest': ('high', 'low', 'highTime', 'lowTime'),
+                 '5m': ('avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume'),
+                 '1h': ('avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume')}
+market_cache = {}
+margin_max_age = int(os.getenv('MARGIN_MAX_AGE', '3600'))
+
+# Sharded mode: SHARD_COUNT processes share data_dir and each runs the first free shard slot. Only the leader polls
+# the wiki, publishing the snapshots to shared_snapshots and the mapping to mapping_file for the others to read
+shard_count = int(os.getenv('SHARD_COUNT', '0'))
+shard_slot = shard_slot_file = leader_lock = shared_snapshots = None
+leader_task = None
+snapshot_task = None
+
+# Timing spans for every command stage, exported at /metrics on metrics_port (0 disables) and by /admin stats. The
+# endpoint only listens on localhost unless METRICS_HOST says otherwise (ex. 0.0.0.0 to scrape a container)
+metrics = Metrics()
+metrics_port = int(os.getenv('METRICS_PORT', '0'))
+metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+metrics_runner = None
+profiler = Profiler(os.path.join(data_dir, 'profiles'))
 
 debug_guild = []
-bot = discord.Bot(debug_guilds=debug_guild)
+if shard_count:
+    # The shard comes from the slot claimed in setup()
+    bot = discord.AutoShardedBot(debug_guilds=debug_guild, shard_count=shard_count)
+else:
+    bot = discord.Bot(debug_guilds=debug_guild)
+
+
+def setup():
+    """
+    Loads the saved mapping, opens the stores in data_dir, claims a shard slot in sharded mode and registers the
+    metrics collectors. Run once before the bot starts.
+    """
+    global item_aliases, item_mapping, mapping_etag, mapping_sha256, item_map, item_meta, item_index
+    global price_history, property_cache, snapshot_archive, watch_list
+    global shard_slot, shard_slot_file, leader_lock, shared_snapshots
+
+    item_aliases = load_aliases(aliases_file)
+    saved, mapping_etag, mapping_sha256 = load_mapping_file(mapping_file)
+    if saved is None:
+        logging.warning(f'No saved item mapping at {mapping_file}, items are unavailable until the first refresh')
+    else:
+        item_mapping = saved
+    item_map = build_item_map(item_mapping)
+    item_meta = build_item_meta(item_mapping)
+    item_index = ItemIndex(item_mapping, item_aliases)
+    logging.info(f'Loaded {len(item_index)} items from {mapping_file} and {len(item_aliases)} aliases')
+
+    price_history = PriceHistory(os.path.join(data_dir, 'history.sqlite3'))
+    property_cache = PropertyCache(max_entries=int(os.getenv('PROPERTY_CACHE_ENTRIES', '2000')),
+                                   ttl=float(os.getenv('PROPERTY_CACHE_TTL', 7 * 24 * 3600)),
+                                   path=os.path.join(data_dir, 'properties.sqlite3')
+                                   if os.getenv('PROPERTY_CACHE_DISK', '1') == '1' else None)
+    if os.getenv('SNAPSHOT_RECORDER', '0') == '1':
+        snapshot_archive = SnapshotArchive(os.path.join(data_dir, 'snapshots'))
+    watch_list = WatchList(os.path.join(data_dir, 'watches.sqlite3'))
+
+    if shard_count:
+        shard_slot, shard_slot_file = claim_slot(data_dir, shard_count)
+        leader_lock = LeaderLock(os.path.join(data_dir, 'leader.lock'))
+        shared_snapshots = SharedSnapshots(os.path.join(data_dir, 'snapshots.sqlite3'))
+        bot.shard_ids = [shard_slot]
+        logging.info(f'Running shard {shard_slot} of {shard_count}')
+
+    metrics.add_collector('wiki', wiki.stats)
+    metrics.add_collector('snapshot_cache', snapshot_cache.stats)
+    metrics.add_collector('chart_cache', chart_cache.stats)
+    metrics.add_collector('render_pool', render_pool.stats)
+    metrics.add_collector('charts', lambda: chart_output)
+    metrics.add_collector('property_cache', property_cache.stats)
+    metrics.add_collector('watch', lambda: {'subscriptions': len(watch_list)})
+    if snapshot_archive is not None:
+        metrics.add_collector('recorder', snapshot_archive.stats)
+    metrics.add_collector('startup', startup.stats)
+    if shard_count:
+        metrics.add_collector('shard', lambda: {'slot': shard_slot, 'leader': int(is_leader())})
+
+    startup.mark('loaded')
+    logging.info('Done loading, syncing commands')
 
 
 def item_to_tuple(value: str):
     """
-    This function takes in a value (either an 'id' or a 'name'), and returns a tuple of (item_id, item_name).
-    If no matching dictionary is found, the function returns None.
+    This function takes in a value (an 'id', a 'name' in any casing, a misspelled name or an alias), and returns a
+    tuple of (item_id, item_name). If no item matches, the function returns (None, None).
+    """
+    item_id, item_name, _ = resolve_item(value)
+    return item_id, item_name
+
+
+def resolve_item(value: str):
+    """
+    Like item_to_tuple, but also returns what no item was found for, in the format of convert_names_to_ids: a tuple of
+    (item_id, item_name, missing), missing being empty when an item matched.
     """
-    value = value.capitalize()
-    if value in item_map:
-        return str(item_map[value]['id']), item_map[value]['name']
+    match, suggestions = item_index.resolve(value)
+    if match is not None:
+        return str(match['id']), match['name'], []
     else:
-        return None, None
+        return None, None, [(value.strip(), suggestions)]
+
+
+def unresolved_note(missing: list):
+    """
+    Lists the entries no item was found for, each with the closest item names, as returned by convert_names_to_ids.
+    """
+    if not missing:
+        return None
+    parts = []
+    for text, suggestions in dict(missing).items():
+        if suggestions:
+            parts.append(f"`{text}` (did you mean {' or '.join(f'`{name}`' for name in suggestions)}?)")
+        else:
+            parts.append(f'`{text}`')
+    return 'No item found for ' + ', '.join(parts)
+
+
+def not_found_message(missing: list):
+    """
+    The reply when none of the requested items exist, suggesting the closest item names. Takes the missing entries as
+    returned by convert_names_to_ids or resolve_item.
+    """
+    note = unresolved_note(missing)
+    return (note + '. ' if note else '') + 'Try `/itemid` to look up any partial item names'
+
+
+async def item_autocomplete(ctx: discord.AutocompleteContext):
+    """
+    Suggests item names for the `item` options, names starting with the typed text first.
+    """
+    return item_index.complete(ctx.value or '')
+
+
+async def items_autocomplete(ctx: discord.AutocompleteContext):
+    """
+    Suggests item names for the `|` separated `items` options, completing only the entry currently being typed.
+    """
+    head, _, current = (ctx.value or '').rpartition('|')
+    head = head + '|' if head else ''
+    return [(head + name)[:100] for name in item_index.complete(current.strip())]
+
+
+async def render_chart(command: str, func, *args):
+    """
+    Renders a chart in the render pool at the given size and in the configured format, and records its size and how
+    long drawing and encoding it took.
+
+    Raises:
+        RenderQueueFull: Too many charts are already being drawn.
+    """
+    with metrics.span(command, 'render'):
+        chart = await render_pool.submit(func, *args, chart_format)
+    metrics.observe(command, 'draw', chart.draw_seconds)
+    metrics.observe(command, 'encode', chart.encode_seconds)
+    chart_output['charts'] += 1
+    chart_output['bytes'] += len(chart.image)
+    chart_output['draw_seconds'] += chart.draw_seconds
+    chart_output['encode_seconds'] += chart.encode_seconds
+    logging.debug(f'Rendered {command} chart: {len(chart.image)} bytes of {chart_format}, drawn in '
+                  f'{chart.draw_seconds * 1000:.0f} ms, encoded in {chart.encode_seconds * 1000:.0f} ms')
+    return chart.image
+
+
+async def run_blocking(func, *args):
+    """
+    Runs a blocking call (disk or database access) in the default thread pool so the event loop keeps running.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def get_properties(game: str, item_name: str, count: bool = True):
+    """
+    Returns the cleaned properties of an item page with lowercase keys, from the property cache when possible.
+    """
+    content = await run_blocking(property_cache.get, game, item_name, count)
+    if content is None:
+        content = await wiki.browse_properties(game, item_name)
+        content = {k.lower(): v for k, v in content.items()}
+        await run_blocking(property_cache.put, game, item_name, content)
+    return content
+
+
+async def prefetch_properties(count: int, game: str = None):
+    """
+    Refreshes the cached properties of the `count` most requested items which are missing or past half their TTL.
+
+    Returns:
+        int: Number of items fetched.
+    """
+    fetched = 0
+    for item_game, item_name in property_cache.most_requested(count, game):
+        age = await run_blocking(property_cache.age, item_game, item_name)
+        if age is not None and age < property_cache.ttl / 2:
+            continue
+        try:
+            content = await wiki.browse_properties(item_game, item_name)
+        except WikiError as e:
+            logging.warning(f'Property prefetch of {item_name} ({item_game}) failed: {e}')
+            continue
+        await run_blocking(property_cache.put, item_game, item_name, {k.lower(): v for k, v in content.items()})
+        fetched += 1
+    await run_blocking(property_cache.flush_requests)
+    return fetched
+
+
+async def property_prefetch_loop():
+    """
+    Keeps the `property_prefetch` most requested items' properties cached, checking every 6 hours.
+    """
+    while True:
+        fetched = await prefetch_properties(property_prefetch)
+        logging.info(f'Prefetched properties for {fetched} items')
+        await asyncio.sleep(6 * 3600)
+
+
+def is_leader():
+    return leader_lock is None or leader_lock.held
+
+
+async def load_snapshot(route: str, fetch):
+    """
+    Loads a snapshot for the snapshot cache, returning `(fetched, content)`. In sharded mode the leader publishes what
+    it fetches and the other processes read the published copy, only going to the wiki themselves if the leader has
+    fallen behind. A published copy keeps the time the leader fetched it, so it expires for everyone at once.
+    """
+    if shared_snapshots is not None and not is_leader():
+        published = await run_blocking(shared_snapshots.load, 'osrs', route)
+        if published is not None and time.time() - published[0] < snapshot_cache.ttls[route]:
+            return published
+        logging.warning(f'No recent {route} snapshot from the leader, fetching it directly')
+
+    content = await fetch()
+    fetched = time.time()
+    if shared_snapshots is not None and is_leader():
+        await run_blocking(shared_snapshots.publish, 'osrs', route, content, fetched)
+    return fetched, content
+
+
+async def update_history(item_id: str, timestep: str):
+    """
+    Stores the points of an item's timeseries newer than what price_history holds, only going to the wiki when it can
+    have published any.
+
+    Returns:
+        bool: True if history is available, even if the wiki failed and only older points are stored.
+    """
+    if not await run_blocking(price_history.needs_fetch, item_id, timestep, time.time()):
+        return True
+    try:
+        fetched = await wiki.timeseries(item_id, timestep)
+    except WikiError as e:
+        logging.warning(f'Timeseries lookup of {item_id} ({timestep}) failed: {e}')
+        return await run_blocking(price_history.watermark, item_id, timestep) is not None
+    added = await run_blocking(price_history.append, item_id, timestep, fetched)
+    logging.debug(f'Stored {added} new {timestep} points for {item_id}')
+    return True
+
+
+async def read_recorded(item_id: str, timestep: str, points: int):
+    """
+    Returns the newest `points` windows of an item recorded in snapshot_archive, in the format of
+    PriceHistory.read_array, or None if there are none.
+    """
+    if snapshot_archive is None or timestep not in ('5m', '1h'):
+        return None
+    start = int(time.time()) - points * TIMESTEP_SECONDS[timestep]
+    data = await run_blocking(snapshot_archive.read_array, timestep, item_id, start)
+    return data if len(data) else None
+
+
+async def recorder_loop():
+    """
+    Records every completed 5m and 1h AvgPrice window into snapshot_archive, checking each minute. Windows are
+    requested by timestamp, so ones missed while the bot was down are still recorded.
+    """
+    while True:
+        for route in ('5m', '1h'):
+            step = TIMESTEP_SECONDS[route]
+            newest = int(time.time()) // step * step - step
+            last = await run_blocking(snapshot_archive.last_timestamp, route)
+            first = newest - (recorder_backfill - 1) * step
+            if last is not None:
+                first = max(first, last + step)
+
+            for window in range(first, newest + 1, step):
+                try:
+                    response = await wiki.prices(route, timestamp=window)
+                except WikiError as e:
+                    logging.warning(f'Recorder: {route} window {window} lookup failed: {e}')
+                    break
+                if not response.get('data'):
+                    # Not published yet
+                    break
+                written = await run_blocking(snapshot_archive.append, route, response.get('timestamp', window),
+                                             response['data'])
+                logging.debug(f'Recorder: Stored {written} items of the {route} window {window}')
+        await asyncio.sleep(60)
+
+
+async def get_latest():
+    """
+    Returns the all-items latest price snapshot, shared between commands until the wiki refreshes it.
+    """
+    return await snapshot_cache.get('osrs', 'latest', lambda: load_snapshot('latest', wiki.latest))
+
+
+async def get_average(timestep: str):
+    """
+    Returns the all-items average price snapshot for a timestep ('5m' or '1h'), shared between commands until the
+    wiki refreshes it.
+    """
+    return await snapshot_cache.get('osrs', timestep,
+                                    lambda: load_snapshot(timestep, lambda: wiki.average(timestep)))
+
+
+def get_mapping_arrays():
+    """
+    Returns the mapping fields used by the market scans as arrays indexed by item ID (see market.mapping_arrays).
+    """
+    cached = market_cache.get('mapping')
+    if cached is None or cached[0] is not item_index:
+        cached = market_cache['mapping'] = (item_index, mapping_arrays(item_index.items))
+    return cached[1]
+
+
+async def get_market_arrays(route: str):
+    """
+    Returns a snapshot ('latest', '5m' or '1h') as arrays indexed by item ID, aligned with get_mapping_arrays(). Each
+    snapshot is only parsed once, however many scans use it.
+    """
+    snapshot = await (get_latest() if route == 'latest' else get_average(route))
+    cached = market_cache.get(route)
+    if cached is None or cached[0] is not snapshot or cached[1] is not item_index:
+        size = len(get_mapping_arrays()['listed']) or None
+        cached = market_cache[route] = (snapshot, item_index, snapshot_arrays(snapshot, market_fields[route], size))
+    return cached[2]
+
+
+async def snapshot_publish_loop():
+    """
+    Leader only: keeps the snapshots the other processes use fresh in shared_snapshots. Each one read since it was
+    last published is refetched a little before it expires, so they never find only a stale copy. Snapshots nobody
+    reads are left to expire, so idle shards cause no wiki requests.
+    """
+    interval = min(snapshot_cache.ttls.values()) / 4
+    while True:
+        for route, ttl in snapshot_cache.ttls.items():
+            if not await run_blocking(shared_snapshots.wanted, 'osrs', route):
+                continue
+            age = snapshot_cache.age('osrs', route)
+            if age is not None and age >= ttl - 2 * interval:
+                snapshot_cache.invalidate('osrs', route)
+            try:
+                await (get_latest() if route == 'latest' else get_average(route))
+            except WikiError as e:
+                logging.warning(f'Snapshot refresh of {route} failed: {e}')
+        await asyncio.sleep(interval)
+
+
+async def refresh_mapping():
+    """
+    Fetches the item mapping and, if it changed, rebuilds the lookups off the event loop, swaps them in and saves the
+    new copy to disk. An unchanged mapping (same ETag or same content hash) is not rebuilt.
+    """
+    global item_map, item_meta, item_index, mapping_etag, mapping_sha256
+
+    etag, body = await wiki.mapping(etag=mapping_etag)
+    if body is None:
+        logging.info('Item mapping unchanged (ETag match)')
+        return
+
+    digest = mapping_digest(body)
+    if digest == mapping_sha256:
+        logging.info('Item mapping unchanged (hash match)')
+        mapping_etag = etag
+        return
+
+    def build():
+        content = json.loads(body)
+        return build_item_map(content), build_item_meta(content), ItemIndex(content, item_aliases)
+
+    new_map, new_meta, new_index = await run_blocking(build)
+
+    # Rebinding the globals swaps the lookups at once for every command that runs after this point
+    item_map, item_meta, item_index = new_map, new_meta, new_index
+    mapping_etag, mapping_sha256 = etag, digest
+    await run_blocking(save_mapping_file, mapping_file, body, etag)
+    logging.info(f'Item mapping refreshed, {len(item_index)} items')
+
+
+async def mapping_refresh_loop():
+    """
+    Refreshes the item mapping every `mapping_refresh` seconds, retrying sooner while no mapping is loaded.
+    """
+    try:
+        age = time.time() - os.path.getmtime(mapping_file)
+    except OSError:
+        age = mapping_refresh
+    delay = max(0, mapping_refresh - age) if len(item_index) else 0
+
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await refresh_mapping()
+            delay = mapping_refresh
+        except (WikiError, ValueError, OSError) as e:
+            logging.warning(f'Item mapping refresh failed: {e}')
+            delay = mapping_refresh if len(item_index) else 60
+
+
+async def reload_mapping():
+    """
+    Followers in sharded mode: swaps in the mapping the leader saved to mapping_file, if it changed since the last
+    load.
+    """
+    global item_map, item_meta, item_index, mapping_etag, mapping_sha256
+
+    def load():
+        content, etag, digest = load_mapping_file(mapping_file)
+        if content is None or digest == mapping_sha256:
+            return None
+        return build_item_map(content), build_item_meta(content), ItemIndex(content, item_aliases), etag, digest
+
+    loaded = await run_blocking(load)
+    if loaded is not None:
+        item_map, item_meta, item_index, mapping_etag, mapping_sha256 = loaded
+        logging.info(f'Item mapping reloaded from {mapping_file}, {len(item_index)} items')
+
+
+def start_leader_tasks():
+    """
+    Starts the background jobs which poll the wiki: the mapping refresh, property prefetching, the price alert
+    poller, the snapshot recorder if enabled and, in sharded mode, the snapshot publisher.
+    """
+    global mapping_task, watch_task, property_prefetch_task, snapshot_task, recorder_task
+    if mapping_task is None:
+        mapping_task = asyncio.create_task(mapping_refresh_loop())
+    if property_prefetch_task is None and property_prefetch > 0:
+        property_prefetch_task = asyncio.create_task(property_prefetch_loop())
+    if watch_task is None:
+        watch_task = asyncio.create_task(watch_poll_loop())
+    if snapshot_task is None and shared_snapshots is not None:
+        snapshot_task = asyncio.create_task(snapshot_publish_loop())
+    if recorder_task is None and snapshot_archive is not None:
+        recorder_task = asyncio.create_task(recorder_loop())
+
+
+async def leader_election_loop():
+    """
+    Sharded mode: follows the leader's mapping until this process can take the leader lock (ex. because the leader
+    exited), then starts the leader tasks.
+    """
+    while not leader_lock.acquire():
+        try:
+            await reload_mapping()
+        except (ValueError, OSError) as e:
+            logging.warning(f'Item mapping reload failed: {e}')
+        await asyncio.sleep(30)
+    logging.info(f'Shard {shard_slot} is now the leader')
+    start_leader_tasks()
+
+
+async def send_alert(row, price: int):
+    """
+    Delivers a fired price alert as a DM, or as a post mentioning the user in the channel it was created in. Returns
+    False if delivery failed but may work later (ex. Discord errors), so the alert should be kept. Alerts which can
+    never be delivered (closed DMs, deleted channel) count as done.
+    """
+    meta = item_meta.get(str(row['item_id']))
+    item_name = meta.name if meta else f"Item {row['item_id']}"
+    movement = 'risen to' if row['above'] else 'fallen to'
+    comparison = 'at or above' if row['above'] else 'at or below'
+
+    embed = discord.Embed(title=f'{item_name} - Price Alert',
+                          url=f"https://prices.runescape.wiki/osrs/item/{row['item_id']}",
+                          description=f"The {row['field']} price has {movement} {price:,} "
+                                      f"(alert #{row['id']}: {comparison} {row['threshold']:,})")
+    if meta:
+        embed.set_thumbnail(url=meta.icon_url)
+    embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
+
+    try:
+        if row['channel_id']:
+            channel = bot.get_channel(row['channel_id']) or await bot.fetch_channel(row['channel_id'])
+            await channel.send(f"<@{row['user_id']}>", embed=embed)
+        else:
+            user = bot.get_user(row['user_id']) or await bot.fetch_user(row['user_id'])
+            await user.send(embed=embed)
+    except (discord.Forbidden, discord.NotFound) as e:
+        logging.warning(f"Watch: Dropping alert #{row['id']}, it cannot be delivered to {row['user_id']}: {e}")
+    except discord.HTTPException as e:
+        logging.warning(f"Watch: Could not deliver alert #{row['id']} to {row['user_id']}, keeping it: {e}")
+        return False
+    except discord.DiscordException as e:
+        logging.warning(f"Watch: Dropping alert #{row['id']}, its channel cannot take messages: {e}")
+    return True
+
+
+async def watch_poll_loop():
+    """
+    Checks every price alert against the Latest snapshot once per refresh cycle. The snapshot comes from the shared
+    cache, so the poller and /latest together make one wiki request per cycle however many alerts exist. Alerts which
+    could not be delivered are put back to fire again on the next cycle, up to watch_delivery_attempts times.
+    """
+    while True:
+        await asyncio.sleep(watch_poll_interval)
+        if not await run_blocking(len, watch_list):
+            continue
+        try:
+            prices = await get_market_arrays('latest')
+        except WikiError as e:
+            logging.warning(f'Watch: Price lookup failed: {e}')
+            continue
+
+        fired = await run_blocking(watch_list.evaluate, prices['high'], prices['low'])
+        if fired:
+            logging.info(f'Watch: {len(fired)} alerts fired')
+        undelivered = []
+        for row, price in fired:
+            if await send_alert(row, price):
+                watch_failures.pop(row['id'], None)
+                continue
+            watch_failures[row['id']] = watch_failures.get(row['id'], 0) + 1
+            if watch_failures[row['id']] < watch_delivery_attempts:
+                undelivered.append(row)
+            else:
+                logging.warning(f"Watch: Dropping alert #{row['id']} after {watch_delivery_attempts} failed deliveries")
+                del watch_failures[row['id']]
+        if undelivered:
+            await run_blocking(watch_list.restore, undelivered)
 
 
 @bot.event
 async def on_ready():
+    global leader_task, metrics_runner
+    if leader_lock is None:
+        start_leader_tasks()
+    elif leader_task is None:
+        leader_task = asyncio.create_task(leader_election_loop())
+    if metrics_runner is None and metrics_port:
+        metrics_runner = await metrics.serve(metrics_host, metrics_port)
+
     await bot.sync_commands()
 
     logging.info(f'We have logged in as {bot.user}')
+    if 'ready' not in startup.marks:
+        startup.mark('ready')
+        logging.info(startup.report())
+
+
+@bot.before_invoke
+async def before_command(ctx: discord.ApplicationContext):
+    ctx.started = time.perf_counter()
+    profiler.start(ctx.interaction.id, ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def after_command(ctx: discord.ApplicationContext):
+    metrics.observe(ctx.command.qualified_name, 'total', time.perf_counter() - ctx.started)
+    profiler.stop(ctx.interaction.id)
 
 
 @bot.event
@@ -73,151 +704,223 @@ async def hello(ctx):
     await ctx.respond("Hello!")
 
 
-@bot.slash_command(name='help', description='Documentation on commands')
-@option('command', description='Which command to provide help (or all)', required=False, default='all')
-async def bot_help(ctx: discord.ApplicationContext, command: str):
-    embed = discord.Embed(title=f'Help - {command.capitalize()}')
-    # embed.set_thumbnail(url='https://oldschool.runescape.wiki/images/' + item_map[item_name]['icon'].replace(' ', '_'))
-
-    valid_commands = ['all', 'latest', 'average', 'timeseries', 'property_lookup', 'search', 'itemid']
+def build_help_embeds():
+    """
+    Builds the /help embed of every documented command once, keyed by command name. Requests only copy one and add
+    the author.
+    """
+    embeds = {}
 
-    if command not in valid_commands:
-        logging.warning(f'Help: User {ctx.author} submitted {command} which is not in the valid commands array')
-        await ctx.respond('Your command is not valid, use `/help` with no command to see valid documented commands')
-        return
+    def add(command: str):
+        embed = discord.Embed(title=f'Help - {command.capitalize()}')
+        embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
+        embeds[command] = embed
+        return embed
 
-    # Running w/ python 3.9 which doesn't support case statements, do many if/then
-    if command == 'all':
-        embed.add_field(name=f"List of valid commands",
-                        value="""`/latest`: Returns the latest real-time price for given items
+    embed = add('all')
+    embed.add_field(name=f"List of valid commands",
+                    value="""`/latest`: Returns the latest real-time price for given items
 `/average`: Returns the average real-time price & volume over a specified time period for given items
 `/timeseries`: Returns a timeseries graph of the latest 365 price & volume datapoints for a specific time step for a given item
 `/property_lookup`: Returns properties and their values for any item.
 `/search`: Searches the RSWiki and returns the page embed.
-`/itemid`: Look up an item by name to find out the item ID""")
-
-    elif command == 'latest':
-        embed.add_field(name=f"OSRS Real-Time Latest Price",
-                        value="Returns the latest real-time price for given item(s)", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`items` - The item name(s) or ID(s) (or a combination) to provide information on. "
-                              "Separate multiple entries with |. Names are not case sensitive but must be spelled "
-                              "exactly correct", inline=False)
-        embed.add_field(name=f"Sample usage",
-                        value="`/latest items:2|coal", inline=False)
-
-    elif command == 'average':
-        embed.add_field(name=f"OSRS Real-Time Average Price",
-                        value="Returns the latest real-time price and volume average for given item(s) over a given "
-                              "time period", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`items` and `timestep`", inline=False)
-        embed.add_field(name='items', value="The item name(s) or ID(s) (or a combination) to provide information on. "
-                                            "Separate multiple entries with |. Names are not case sensitive but must "
-                                            "be spelled exactly correct", inline=True)
-        embed.add_field(name='timestep (optional)',
-                        value="The time period to provide the average for. 5m and 1h are the accepted"
-                        "values by RSWiki. Default 5m if not provided", inline=True)
-        embed.add_field(name=f"Sample usage",
-                        value="`/average items:coal timestep:5m`", inline=False)
-
-    elif command == 'timeseries':
-        embed.add_field(name=f"OSRS Real-Time Timeseries Graph",
-                        value="Returns a graph showing the last 365 price & volume points for a specific"
-                        "item and a specific time step", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`item`, `timestep`, `volume`", inline=False)
-        embed.add_field(name='item', value="The item name or ID to provide information on. Names are not case "
-                                           "sensitive but must be spelled exactly correct", inline=True)
-        embed.add_field(name='timestep (optional)',
-                        value="The time period to provide the average for. 5m and 1h are the accepted"
-                        "values by RSWiki. Default 5m if not provided", inline=True)
-        embed.add_field(name='volume (optional)',
-                        value="True to include volume information, False for only price information. Default True",
-                        inline=True)
-        embed.add_field(name=f"Sample usage",
-                        value="`/timeseries items:coal timestep:5m, volume:True`", inline=False)
-
-    elif command == 'property_lookup':
-        embed.add_field(name=f"RS3 or OSRS Item Property Lookup",
-                        value="Returns a selection of properties for a given item", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`item`, `game`, `prop`", inline=False)
-        embed.add_field(name='item', value="The item name or ID to provide information on. Names are not case "
-                                           "sensitive but must be spelled exactly correct", inline=True)
-        embed.add_field(name='game',
-                        value="The game to look up. OSRS or RS3 (not case sensitive). Default OSRS", inline=True)
-        embed.add_field(name='prop (optional)',
-                        value="The property(ies) to display. Attempts to match partial names (ex. 'id' matches "
-                              "'item_id'). Leave blank to display all properties. If listing multiple properties, "
-                              "split with |",
-                        inline=True)
-        embed.add_field(name=f"Sample usage",
-                        value="`/property_lookup item:coal game:osrs`", inline=False)
-
-    elif command == 'search':
-        embed.add_field(name=f"RS3 or OSRS Page Search",
-                        value="Returns the search result for the given page", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`page` and `game`", inline=False)
-        embed.add_field(name='page', value="The page to search. Not case sensitive. Returns the closest match",
-                        inline=True)
-        embed.add_field(name='game',
-                        value="The game to look up. OSRS or RS3 (not case sensitive). Default OSRS", inline=True)
-        embed.add_field(name=f"Sample usage",
-                        value="`/search page:coal game:osrs`", inline=False)
-
-    elif command == 'itemid':
-        embed.add_field(name=f"OSRS Item mapping lookup",
-                        value="Look up an item by name to find out the item ID", inline=False)
-        embed.add_field(name=f"Arguments",
-                        value="`name` - The item name to pair with an ID. Provides all partial name matches. Names "
-                              "are not case sensitive", inline=False)
-        embed.add_field(name=f"Sample usage",
-                        value="`/itemid name:crystal", inline=False)
+`/itemid`: Look up an item by name to find out the item ID
+`/watch`: Get notified when an item price crosses a threshold
+`/margins`: Ranks every item by its current buy/sell margin
+`/movers`: Ranks every item by its price change or trade volume over the last hour
+`/compare`: Charts the price changes of several items together""")
+
+    embed = add('latest')
+    embed.add_field(name=f"OSRS Real-Time Latest Price",
+                    value="Returns the latest real-time price for given item(s)", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`items` - The item name(s) or ID(s) (or a combination) to provide information on. "
+                          "Separate multiple entries with |. Names are not case sensitive and small typos are "
+                          "corrected", inline=False)
+    embed.add_field(name='compact (optional)',
+                    value=f"True to list every item in one table, False for an embed per item. Default is a "
+                          f"table above 10 items. Up to {max_items} items per request", inline=False)
+    embed.add_field(name=f"Sample usage",
+                    value="`/latest items:2|coal", inline=False)
+
+    embed = add('average')
+    embed.add_field(name=f"OSRS Real-Time Average Price",
+                    value="Returns the latest real-time price and volume average for given item(s) over a given "
+                          "time period", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`items`, `timestep`, `compact`", inline=False)
+    embed.add_field(name='items', value="The item name(s) or ID(s) (or a combination) to provide information on. "
+                                        "Separate multiple entries with |. Names are not case sensitive and small "
+                                        "typos are corrected", inline=True)
+    embed.add_field(name='timestep (optional)',
+                    value="The time period to provide the average for. 5m and 1h are the accepted"
+                    "values by RSWiki. Default 5m if not provided", inline=True)
+    embed.add_field(name='compact (optional)',
+                    value=f"True to list every item in one table, False for an embed per item. Default is a "
+                          f"table above 10 items. Up to {max_items} items per request", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/average items:coal timestep:5m`", inline=False)
+
+    embed = add('timeseries')
+    embed.add_field(name=f"OSRS Real-Time Timeseries Graph",
+                    value="Returns a graph showing the last 365 price & volume points for a specific"
+                    "item and a specific time step", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`item`, `timestep`, `volume`, `points`, `size`", inline=False)
+    embed.add_field(name='item', value="The item name or ID to provide information on. Names are not case "
+                                       "sensitive and small typos are corrected", inline=True)
+    embed.add_field(name='timestep (optional)',
+                    value="The time period to provide the average for. 5m and 1h are the accepted"
+                    "values by RSWiki. Default 5m if not provided", inline=True)
+    embed.add_field(name='volume (optional)',
+                    value="True to include volume information, False for only price information. Default True",
+                    inline=True)
+    embed.add_field(name='points (optional)',
+                    value="How many points to chart. Points fetched earlier are kept, so this can go beyond the "
+                          "365 the wiki returns. Default 365", inline=True)
+    embed.add_field(name='size (optional)', value=f"Small, medium or large chart. Default {chart_size}", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/timeseries items:coal timestep:5m, volume:True`", inline=False)
+
+    embed = add('compare')
+    embed.add_field(name=f"OSRS Price Comparison Graph",
+                    value="Returns one graph of the percentage price change of several items over the same "
+                          "period, so items of any value can be compared", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`items`, `timestep`, `points`, `size`", inline=False)
+    embed.add_field(name='items', value="The item names or IDs to compare, separated with |. Up to "
+                                        f"{compare_max_items} items", inline=True)
+    embed.add_field(name='timestep (optional)', value="5m, 1h, 6h or 24h. Default 1h", inline=True)
+    embed.add_field(name='points (optional)', value="How many points to chart. Default 365", inline=True)
+    embed.add_field(name='size (optional)', value=f"Small, medium or large chart. Default {chart_size}", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/compare items:coal|iron ore|mithril ore timestep:6h`", inline=False)
+
+    embed = add('property_lookup')
+    embed.add_field(name=f"RS3 or OSRS Item Property Lookup",
+                    value="Returns a selection of properties for a given item", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`item`, `game`, `prop`", inline=False)
+    embed.add_field(name='item', value="The item name or ID to provide information on. Names are not case "
+                                       "sensitive and small typos are corrected", inline=True)
+    embed.add_field(name='game',
+                    value="The game to look up. OSRS or RS3 (not case sensitive). Default OSRS", inline=True)
+    embed.add_field(name='prop (optional)',
+                    value="The property(ies) to display. Attempts to match partial names (ex. 'id' matches "
+                          "'item_id'). Leave blank to display all properties. If listing multiple properties, "
+                          "split with |",
+                    inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/property_lookup item:coal game:osrs`", inline=False)
+
+    embed = add('search')
+    embed.add_field(name=f"RS3 or OSRS Page Search",
+                    value="Returns the search result for the given page", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`page` and `game`", inline=False)
+    embed.add_field(name='page', value="The page to search. Not case sensitive. Returns the closest match",
+                    inline=True)
+    embed.add_field(name='game',
+                    value="The game to look up. OSRS or RS3 (not case sensitive). Default OSRS", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/search page:coal game:osrs`", inline=False)
+
+    embed = add('itemid')
+    embed.add_field(name=f"OSRS Item mapping lookup",
+                    value="Look up an item by name to find out the item ID", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`name` - The item name to pair with an ID. Provides all partial name matches. Names "
+                          "are not case sensitive", inline=False)
+    embed.add_field(name=f"Sample usage",
+                    value="`/itemid name:crystal", inline=False)
+
+    embed = add('watch')
+    embed.add_field(name=f"OSRS Price Alerts",
+                    value="Get a DM (or a channel post) when an item's real-time price crosses a threshold. "
+                          "Alerts fire once and are then removed, also if the bot cannot message you (ex. your DMs "
+                          "are closed)", inline=False)
+    embed.add_field(name=f"Subcommands",
+                    value="`/watch add`, `/watch list`, `/watch remove`", inline=False)
+    embed.add_field(name='add',
+                    value="`item`, `price` and optionally `direction` (above or below, default above), "
+                          "`price_type` (buy or sell, default buy) and `here` (post in this channel instead of "
+                          f"a DM). Up to {watch_max_per_user} alerts per user", inline=True)
+    embed.add_field(name='remove', value="`alert` - The alert number shown by `/watch list`", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/watch add item:coal price:200 direction:above`", inline=False)
+
+    embed = add('margins')
+    embed.add_field(name=f"OSRS Margin Scan",
+                    value="Ranks every tradeable item by the difference between its latest instant buy and "
+                          f"instant sell price. Prices older than {margin_max_age // 60} minutes are ignored",
+                    inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`sort`, `count`, `min_price`", inline=False)
+    embed.add_field(name='sort (optional)',
+                    value="margin, roi (margin as a percentage of the sell price) or potential (margin times "
+                          "the GE buy limit). Default margin", inline=True)
+    embed.add_field(name='count (optional)', value="How many items to list. Default 10", inline=True)
+    embed.add_field(name='min_price (optional)', value="Ignore items selling below this price. Default 0",
+                    inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/margins sort:potential count:20`", inline=False)
+
+    embed = add('movers')
+    embed.add_field(name=f"OSRS Market Movers",
+                    value="Ranks every tradeable item by how far its 5m average price is from its 1h average, "
+                          "or by how many were traded in the last hour", inline=False)
+    embed.add_field(name=f"Arguments",
+                    value="`sort`, `count`, `min_volume`", inline=False)
+    embed.add_field(name='sort (optional)', value="gainers, losers or volume. Default gainers", inline=True)
+    embed.add_field(name='count (optional)', value="How many items to list. Default 10", inline=True)
+    embed.add_field(name='min_volume (optional)',
+                    value="Ignore items traded fewer times than this in the last hour. Default 100", inline=True)
+    embed.add_field(name=f"Sample usage",
+                    value="`/movers sort:losers min_volume:1000`", inline=False)
+
+    return embeds
+
+
+help_embeds = build_help_embeds()
 
+
+@bot.slash_command(name='help', description='Documentation on commands')
+@option('command', description='Which command to provide help (or all)', required=False, default='all')
+async def bot_help(ctx: discord.ApplicationContext, command: str):
+    template = help_embeds.get(command)
+    if template is None:
+        logging.warning(f'Help: User {ctx.author} submitted {command} which is not in the valid commands array')
+        await ctx.respond('Your command is not valid, use `/help` with no command to see valid documented commands')
+        return
+
+    embed = template.copy()
     embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
-    embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
     await ctx.respond(embed=embed)
 
 
 def convert_names_to_ids(id_string: str):
     """
-    Converts any non-numeric elements in the input string to numeric elements using the name_conversion function, and
-    then returns a new string with the numeric elements.
+    Converts every element of the input string (an item ID, name, misspelled name or alias) to its item ID, and
+    returns a new string with the IDs.
 
     Args:
         id_string (str): A string formatted '1|2|3' or 'Test|Text|Name'
 
     Returns:
-        str: A new string with the same elements as the input string, but with any non-numeric elements converted to
-             numeric elements using the convert_identifier function. Any elements which fail name_conversion are removed
+        tuple: (ids, missing) - ids is a string formatted '1|2|3' with the IDs of the elements which matched an item,
+               in input order, and missing is a list of (element, suggested item names) for the ones which did not
     """
-
-    # Split the input string into a list of elements.
-    item_list = id_string.split('|')
-
-    # Iterate over the elements in the list.
-    for i, item in enumerate(item_list):
-        # If the element is numeric, skip it.
-        logging.debug(f'Checking {item}')
-        if item.isnumeric():
+    ids, missing = [], []
+    for item in id_string.split('|'):
+        if not item.strip():
             continue
-
-        # If the element is not numeric, it is a name.
-        # Convert the name to a numeric element function.
-        temp_id, temp_name = item_to_tuple(item)
-        logging.debug(f'Got {temp_id}, {temp_name}')
-        # If the converted element is numeric, replace the original non-numeric element with the numeric element
-        # in the id_list array.
-        if temp_id.isnumeric():
-            item_list[i] = str(temp_id)
+        match, suggestions = item_index.resolve(item)
+        logging.debug(f'Resolved {item} to {match and match["id"]}')
+        if match is not None:
+            ids.append(str(match['id']))
         else:
-            item_list.pop(i)
-
-    # Return a string with the same elements as the input string, but with any non-numeric elements converted to
-    # numeric elements using the name_conversion function.
-    return '|'.join(item_list)
+            missing.append((item.strip(), suggestions))
+    return '|'.join(ids), missing
 
 
 def pretty_timestamp(timestamp):
@@ -255,231 +958,452 @@ def pretty_timestamp(timestamp):
         return '{} hours ago'.format(int(s / 3600))
 
 
+def format_price(value):
+    """
+    Formats a price or volume with thousands separators, or '-' when the wiki has no value.
+    """
+    return '-' if value is None else f'{value:,}'
+
+
+def requested_ids(ids: str):
+    """
+    Splits a converted `|` separated ID string into unique known item IDs, keeping the requested order and capping the
+    count at `max_items`.
+
+    Returns:
+        tuple: (ids, number of IDs dropped by the cap)
+    """
+    id_list = list(dict.fromkeys(i for i in ids.split('|') if i in item_map))
+    return id_list[:max_items], max(0, len(id_list) - max_items)
+
+
+def sign_embed(ctx: discord.ApplicationContext, embed: discord.Embed):
+    """
+    Adds the requesting user as the author and the bot footer to an embed, and returns it.
+    """
+    embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
+    embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
+    return embed
+
+
+def table_embeds(ctx: discord.ApplicationContext, title: str, header: tuple, rows: list):
+    """
+    Builds compact embeds listing one item per row of a monospace table, `table_rows_per_embed` rows per embed.
+    """
+    rows = [(str(r[0])[:24],) + tuple(r[1:]) for r in rows]
+    widths = [max(len(str(r[i])) for r in [header] + rows) for i in range(len(header))]
+
+    def line(row):
+        return '  '.join(str(c).ljust(w) if i == 0 else str(c).rjust(w) for i, (c, w) in enumerate(zip(row, widths)))
+
+    embeds = []
+    for start in range(0, len(rows), table_rows_per_embed):
+        chunk = rows[start:start + table_rows_per_embed]
+        embed = discord.Embed(title=title if start == 0 else f'{title} (continued)',
+                              description='```\n' + '\n'.join(line(r) for r in [header] + chunk) + '\n```')
+        sign_embed(ctx, embed)
+        embeds.append(embed)
+    return embeds
+
+
+async def respond_embeds(ctx: discord.ApplicationContext, embeds: list, content: str = None):
+    """
+    Sends embeds packed into as few messages as Discord allows (10 embeds and 6000 characters of embed text per
+    message), instead of one message per embed.
+    """
+    batch, size = [], 0
+    for embed in embeds:
+        if batch and (len(batch) == 10 or size + len(embed) > 6000):
+            await ctx.respond(content, embeds=batch)
+            batch, size, content = [], 0, None
+        batch.append(embed)
+        size += len(embed)
+    if batch:
+        await ctx.respond(content, embeds=batch)
+
+
+def latest_embed(ctx: discord.ApplicationContext, item: str, rt_latest: dict):
+    """
+    Builds the /latest embed of one item from its entry in the Latest snapshot (None if it has no trades).
+    """
+    meta = item_meta[item]
+
+    embed = discord.Embed(title=f'{meta.name} - Latest Prices', url=meta.prices_url)
+    embed.set_thumbnail(url=meta.icon_url)
+
+    if rt_latest is None:
+        embed.add_field(name='No prices', value='This item has no recorded trades')
+    else:
+        embed.add_field(name=f"Buy Price: {rt_latest['high']}",
+                        value=f"{pretty_timestamp(rt_latest['highTime'])}")
+        embed.add_field(name=f"Sell Price: {rt_latest['low']}",
+                        value=f"{pretty_timestamp(rt_latest['lowTime'])}")
+
+    return sign_embed(ctx, embed)
+
+
+def average_embed(ctx: discord.ApplicationContext, item: str, timestep: str, average_price: dict):
+    """
+    Builds the /average embed of one item from its entry in the AvgPrice snapshot (None if it was not traded).
+    """
+    meta = item_meta[item]
+
+    embed = discord.Embed(title=f'{meta.name} - {timestep} Average Prices', url=meta.prices_url)
+    embed.set_thumbnail(url=meta.icon_url)
+
+    if average_price is None:
+        embed.add_field(name='No prices', value=f'This item was not traded in the last {timestep}')
+    else:
+        embed.add_field(name=f"Buy Price: {average_price['avgHighPrice']}",
+                        value=f"Volume - {average_price['highPriceVolume']}")
+        embed.add_field(name=f"Sell Price: {average_price['avgLowPrice']}",
+                        value=f"Volume - {average_price['lowPriceVolume']}")
+
+    return sign_embed(ctx, embed)
+
+
+def capped_note(dropped: int):
+    if dropped:
+        return f'Only the first {max_items} items are shown, {dropped} more were left out'
+    return None
+
+
+def join_notes(*notes):
+    return '\n'.join(note for note in notes if note) or None
+
+
 @bot.slash_command(description='Get latest real-time prices')
-@option('items', description='Specific item IDs or names(separate with | for multiple)', required=True)
+@option('items', description='Specific item IDs or names(separate with | for multiple)', required=True,
+        autocomplete=items_autocomplete)
+@option('compact', description='One table for all items instead of an embed per item (Default: above 10 items)',
+        required=False, default=None)
 async def latest(ctx: discord.ApplicationContext,
-                 items: str):
+                 items: str, compact: bool):
     logging.debug(f'Input {items}')
-    ids = convert_names_to_ids(items)
+    ids, missing = convert_names_to_ids(items)
 
     if ids is None or ids == '':
         logging.warning(f'Latest: User {ctx.author} submitted {items} which converted to {ids} and broke '
                         f'/latest')
-        await ctx.respond('Unable to find any valid item IDs that match your request, '
-                          'try `/itemid` to look up any partial item names')
+        await ctx.respond(not_found_message(missing))
         return
 
     await ctx.defer()
 
     logging.debug(f'Looking up {ids}')
-    real_time = Latest(user_agent=user_agent)
-    for item in ids.split('|'):
-        item_name = item_map[item]['name']
-        rt_latest = real_time.content.get(item)
-
-        embed = discord.Embed(title=f'{item_name} - Latest Prices',
-                              url='https://prices.runescape.wiki/osrs/item/' + item)
-        embed.set_thumbnail(
-            url='https://oldschool.runescape.wiki/images/' + item_map[item_name]['icon'].replace(' ', '_'))
+    try:
+        with metrics.span('latest', 'fetch'):
+            real_time = await get_latest()
+    except WikiError as e:
+        logging.warning(f'Latest: Price lookup for {ids} failed: {e}')
+        await ctx.respond('The wiki did not respond, try again in a moment')
+        return
 
-        embed.add_field(name=f"Buy Price: {rt_latest['high']}",
-                        value=f"{pretty_timestamp(rt_latest['highTime'])}")
-        embed.add_field(name=f"Sell Price: {rt_latest['low']}",
-                        value=f"{pretty_timestamp(rt_latest['lowTime'])}")
+    id_list, dropped = requested_ids(ids)
+    if compact is None:
+        compact = len(id_list) > 10
+
+    with metrics.span('latest', 'transform'):
+        if compact:
+            rows = []
+            for item in id_list:
+                rt_latest = real_time.get(item, {})
+                rows.append((item_map[item]['name'], format_price(rt_latest.get('high')),
+                             format_price(rt_latest.get('low'))))
+            embeds = table_embeds(ctx, 'Latest Prices', ('Item', 'Buy', 'Sell'), rows)
+        else:
+            embeds = [latest_embed(ctx, item, real_time.get(item)) for item in id_list]
 
-        embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
-        embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
-        await ctx.respond(embed=embed)
+    with metrics.span('latest', 'respond'):
+        await respond_embeds(ctx, embeds, join_notes(unresolved_note(missing), capped_note(dropped)))
 
 
 @bot.slash_command(description='Get 5m or 1h average prices')
-@option('items', description='Specific item IDs or names(separate with | for multiple)', required=True)
+@option('items', description='Specific item IDs or names(separate with | for multiple)', required=True,
+        autocomplete=items_autocomplete)
 @option('timestep', description='Choose a timestep (5m or 1h)', required=True, default='5m')
-async def average(ctx: discord.ApplicationContext, items: str, timestep: str):
-    try:
-        ids = convert_names_to_ids(items)
-    except TypeError:
-        logging.warning(f'Average: User {ctx.author} submitted {items} which threw a TypeError when '
-                        f'converting ids')
-        await ctx.respond('Failed item lookup, ensure you are using a valid item name or ID')
-        return
+@option('compact', description='One table for all items instead of an embed per item (Default: above 10 items)',
+        required=False, default=None)
+async def average(ctx: discord.ApplicationContext, items: str, timestep: str, compact: bool):
+    ids, missing = convert_names_to_ids(items)
 
     if ids is None or ids == '':
         logging.warning(f'Average: User {ctx.author} submitted {items} which converted to {ids} and will '
                         f'not work with the request')
-        await ctx.respond('Unable to find any valid item IDs that match your request, '
-                          'try `/itemid` to look up any partial item names')
+        await ctx.respond(not_found_message(missing))
+        return
+
+    if timestep not in ['5m', '1h']:
+        logging.warning(f'Average: User {ctx.author} submitted {timestep} which is not a valid timestep')
+        await ctx.respond('Failed price lookup, ensure you are using a valid timestep (5m, 1h)')
         return
 
     await ctx.defer()
 
     try:
-        real_time = AvgPrice(route=timestep, user_agent=user_agent)
-    except KeyError:
-        logging.warning(f'Average: User {ctx.author} submitted {timestep} which threw a KeyError when '
-                        f'trying to pull average price')
-        await ctx.respond('Failed price lookup, ensure you are using a valid timestep (5m, 1h)')
+        with metrics.span('average', 'fetch'):
+            real_time = await get_average(timestep)
+    except WikiError as e:
+        logging.warning(f'Average: Price lookup for {ids} failed: {e}')
+        await ctx.respond('The wiki did not respond, try again in a moment')
         return
 
-    for item in ids.split('|'):
-        item_name = item_map[item]['name']
+    id_list, dropped = requested_ids(ids)
+    if compact is None:
+        compact = len(id_list) > 10
+
+    with metrics.span('average', 'transform'):
+        if compact:
+            rows = []
+            for item in id_list:
+                average_price = real_time.get(item, {})
+                rows.append((item_map[item]['name'],
+                             format_price(average_price.get('avgHighPrice')),
+                             format_price(average_price.get('highPriceVolume')),
+                             format_price(average_price.get('avgLowPrice')),
+                             format_price(average_price.get('lowPriceVolume'))))
+            embeds = table_embeds(ctx, f'{timestep} Average Prices', ('Item', 'Buy', 'Vol', 'Sell', 'Vol'), rows)
+        else:
+            embeds = [average_embed(ctx, item, timestep, real_time.get(item)) for item in id_list]
+
+    with metrics.span('average', 'respond'):
+        await respond_embeds(ctx, embeds, join_notes(unresolved_note(missing), capped_note(dropped)))
+
+
+@bot.slash_command(description='Rank items by their current buy/sell margin')
+@option('sort', description='Rank by margin, return on investment or margin times buy limit (Default margin)',
+        required=False, default='margin', choices=['margin', 'roi', 'potential'])
+@option('count', description='How many items to list (Default 10)', required=False, default=10, min_value=1,
+        max_value=50)
+@option('min_price', description='Ignore items selling below this price (Default 0)', required=False, default=0,
+        min_value=0)
+async def margins(ctx: discord.ApplicationContext, sort: str, count: int, min_price: int):
+    if not len(item_index):
+        await ctx.respond('The item list is still loading, try again in a moment')
+        return
 
-        embed = discord.Embed(title=f'{item_name} - {timestep} Average Prices',
-                              url='https://prices.runescape.wiki/osrs/item/' + item)
-        embed.set_thumbnail(url='https://oldschool.runescape.wiki/images/' + item_map[item]['icon'].replace(' ', '_'))
-        embed.add_field(name=f"Buy Price: {real_time.content[item]['avgHighPrice']}",
-                        value=f"Volume - {real_time.content[item]['highPriceVolume']}")
-        embed.add_field(name=f"Sell Price: {real_time.content[item]['avgLowPrice']}",
-                        value=f"Volume - {real_time.content[item]['lowPriceVolume']}")
+    await ctx.defer()
 
-        embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
-        embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
+    try:
+        with metrics.span('margins', 'fetch'):
+            latest_prices = await get_market_arrays('latest')
+    except WikiError as e:
+        logging.warning(f'Margins: Price lookup failed: {e}')
+        await ctx.respond('The wiki did not respond, try again in a moment')
+        return
 
-        await ctx.respond(embed=embed)
+    with metrics.span('margins', 'transform'):
+        ranked = scan_margins(latest_prices, get_mapping_arrays(), sort, count, min_price,
+                              oldest=time.time() - margin_max_age)
+        rows = [(item_map[str(item)]['name'], format_price(int(high)), format_price(int(low)),
+                 format_price(int(margin)), f'{roi:.1f}%', '-' if limit is None else format_price(int(limit)))
+                for item, high, low, margin, roi, limit in ranked]
+        embeds = table_embeds(ctx, f'Top Margins by {sort.capitalize()}',
+                              ('Item', 'Buy', 'Sell', 'Margin', 'ROI', 'Limit'), rows)
+
+    with metrics.span('margins', 'respond'):
+        if rows:
+            await respond_embeds(ctx, embeds)
+        else:
+            await ctx.respond('No items have recent buy and sell prices matching your filters')
+
+
+@bot.slash_command(description='Rank items by their price change or trade volume over the last hour')
+@option('sort', description='Biggest rises, biggest falls or most traded (Default gainers)', required=False,
+        default='gainers', choices=['gainers', 'losers', 'volume'])
+@option('count', description='How many items to list (Default 10)', required=False, default=10, min_value=1,
+        max_value=50)
+@option('min_volume', description='Ignore items trading fewer than this many in the last hour (Default 100)',
+        required=False, default=100, min_value=0)
+async def movers(ctx: discord.ApplicationContext, sort: str, count: int, min_volume: int):
+    if not len(item_index):
+        await ctx.respond('The item list is still loading, try again in a moment')
+        return
+
+    await ctx.defer()
+
+    try:
+        with metrics.span('movers', 'fetch'):
+            recent, hourly = await asyncio.gather(get_market_arrays('5m'), get_market_arrays('1h'))
+    except WikiError as e:
+        logging.warning(f'Movers: Price lookup failed: {e}')
+        await ctx.respond('The wiki did not respond, try again in a moment')
+        return
+
+    with metrics.span('movers', 'transform'):
+        ranked = scan_movers(recent, hourly, get_mapping_arrays(), sort, count, min_volume)
+        rows = [(item_map[str(item)]['name'], format_price(None if recent_price is None else int(recent_price)),
+                 format_price(None if hourly_price is None else int(hourly_price)),
+                 '-' if change is None else f'{change:+.1f}%', format_price(int(volume)))
+                for item, recent_price, hourly_price, change, volume in ranked]
+        embeds = table_embeds(ctx, f'Top Movers - {sort.capitalize()}',
+                              ('Item', '5m Avg', '1h Avg', 'Change', '1h Volume'), rows)
+
+    with metrics.span('movers', 'respond'):
+        if rows:
+            await respond_embeds(ctx, embeds)
+        else:
+            await ctx.respond('No items traded enough in the last hour to rank')
 
 
 @bot.slash_command(description='Generate historical pricing')
-@option('item', description='Item name or item ID', required=True)
+@option('item', description='Item name or item ID', required=True, autocomplete=item_autocomplete)
 @option('timestep', description='Step for time stamps (5m, 1h)', required=False, default='5m')
 @option('volume', description='Include volume? (Default yes)', required=False, default=True)
-async def timeseries(ctx: discord.ApplicationContext, item: str, timestep: str, volume: bool):
-    item_id, item_name = item_to_tuple(item)
+@option('points', description='Number of points to chart (Default 365)', required=False, default=365, min_value=2,
+        max_value=history_max_points)
+@option('size', description='Chart size', required=False, default=None, choices=list(CHART_SIZES))
+async def timeseries(ctx: discord.ApplicationContext, item: str, timestep: str, volume: bool, points: int,
+                     size: str):
+    item_id, item_name, missing = resolve_item(item)
 
     if item_id is None or item_name is None:
         logging.warning(f'Timeseries: User {ctx.author} submitted {item} which converted to '
                         f'({item_id}, {item_name}) is not a valid item pair')
-        await ctx.respond('Unable to find any valid items that match your request, '
-                          'try `/itemid` to look up any partial item names')
+        await ctx.respond(not_found_message(missing))
         return
 
-    if 'm' in timestep:
-        freq = timestep.strip('m') + 'min'
-    elif 'h' in timestep:
-        freq = timestep
-    else:
+    if timestep not in TIMESTEP_SECONDS:
         logging.warning(f'Timeseries: User {ctx.author} submitted {timestep} which is invalid')
         await ctx.respond(f"Invalid timestep '{timestep}'")
         return
 
-    try:
-        time_series = TimeSeries(id=item_id, timestep=timestep, user_agent=user_agent)
-    except KeyError:
-        logging.warning(f'Average: User {ctx.author} submitted {timestep}  and {item} which threw a '
-                        f'KeyError when trying to pull average price')
-        await ctx.respond('Failed lookup, ensure you are using a valid item and timestep (5m, 1h)')
-        return
+    await ctx.defer()
 
-    # Format the data
-    df = pd.DataFrame(time_series.content)
+    with metrics.span('timeseries', 'fetch'):
+        available = await update_history(item_id, timestep)
 
-    await ctx.defer()
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
-
-    # Add any missing intervals, format unix to datetime
-    start = pd.to_datetime(df[['timestamp'][0]].min(), unit='s')
-    end = pd.to_datetime(df[['timestamp'][0]].max(), unit='s')
-    dates = pd.date_range(start=start, end=end, freq=freq).to_pydatetime()
-
-    df = df.set_index('timestamp').reindex(dates).reset_index().reindex(columns=df.columns)
-
-    # Fill any NaN entries
-    df[['avgHighPrice', 'avgLowPrice']] = df[['avgHighPrice', 'avgLowPrice']].fillna(method='ffill')
-    df[['highPriceVolume', 'lowPriceVolume']] = df[['highPriceVolume', 'lowPriceVolume']].fillna(0)
-
-    # Invert lowPriceVolume
-    df[['lowPriceVolume']] = df[['lowPriceVolume']] * -1
-
-    # Initialize IO
-    data_stream = io.BytesIO()
-
-    # Do plotting
-
-    plt.style.use('dark_background')
-
-    # More involved subplotting for price and volume data
-    if volume:
-        fig, axs = plt.subplots(nrows=2, sharex=False, figsize=(15, 10))
-        plt.subplots_adjust(hspace=0.5)
-
-        width = np.min(np.diff(mdates.date2num(df[['timestamp'][0]])))
-
-        axs[0].plot('timestamp', 'avgHighPrice', data=df, label='High Price', color='#ffa333')
-        axs[0].plot('timestamp', 'avgLowPrice', data=df, label='Low Price', color='#33ff5f')
-        axs[0].legend()
-        axs[0].set_title(f'Price - {item_name.capitalize()} - ID {item_id}')
-
-        axs[1].bar('timestamp', 'highPriceVolume', width=width, data=df, label='High Price Volume', color='#ffa333',
-                   ec="k", lw=0.1)
-        axs[1].bar('timestamp', 'lowPriceVolume', width=width, data=df, label='Low Price Volume', color='#33ff5f',
-                   ec="k", lw=0.1)
-        axs[1].legend()
-        axs[1].set_title(f'Volume - {item_name.capitalize()} - ID {item_id}')
-
-        for nn, ax in enumerate(axs):
-            locator = mdates.AutoDateLocator()
-            formatter = mdates.ConciseDateFormatter(locator)
-            formatter.formats = ['%y',  # ticks are mostly years
-                                 '%b %d',  # ticks are mostly months
-                                 '%b %d',  # ticks are mostly days
-                                 '%H:%M',  # hrs
-                                 '%H:%M',  # min
-                                 '', ]  # secs
-            # these are mostly just the level above...
-            formatter.zero_formats = [''] + formatter.formats[:-1]
-            # ...except for ticks that are mostly hours, then it is nice to have
-            # day-month:
-            formatter.zero_formats[3] = '%d-%b'
-
-            formatter.offset_formats = ['',
-                                        '%Y',
-                                        '%b %Y',
-                                        '%d %b %Y',
-                                        '%d %b %Y',
-                                        '%d %b %Y %H:%M', ]
-
-            ax.xaxis.set_major_locator(locator)
-            ax.xaxis.set_major_formatter(formatter)
-            ax.set_xlim(left=df[['timestamp'][0]].min(), right=df[['timestamp'][0]].max())
-            plt.setp(ax.get_xticklabels(), visible=True, rotation=30)
-            ax.grid(True, color='0.4')
+    # Without any timeseries from the wiki, fall back to the recorded AvgPrice windows
+    with metrics.span('timeseries', 'transform'):
+        if available:
+            time_series = await run_blocking(price_history.read_array, item_id, timestep, points)
+        else:
+            time_series = await read_recorded(item_id, timestep, points)
 
-    else:
-        fig, axs = plt.subplots(figsize=(15, 5))
-        df.plot(ax=axs, x="timestamp", y=['avgHighPrice', 'avgLowPrice'], xlabel='timestamp', ylabel='price',
-                color=['#ffa333', '#33ff5f'])
-        axs.set_title(f'Price - {item_name.capitalize()} - ID {item_id}')
-        axs.grid(True, color='0.4')
+    if time_series is None:
+        await ctx.respond('Failed lookup, ensure you are using a valid item and timestep (5m, 1h)')
+        return
 
-    # Save content into the data stream
-    plt.savefig(data_stream, format='png', bbox_inches="tight", dpi=80)
-    plt.close()
+    if not len(time_series):
+        logging.warning(f'Timeseries: No {timestep} data returned for {item_name} ({item_id})')
+        await ctx.respond(f'No {timestep} price history is available for {item_name}')
+        return
+
+    size = size or chart_size
+    chart_key = (item_id, timestep, volume, points, size, int(time_series[-1, 0]))
+    image = chart_cache.get(chart_key)
+    if image is None:
+        try:
+            image = await render_chart('timeseries', render_timeseries, time_series, TIMESTEP_SECONDS[timestep],
+                                       item_name, item_id, volume, size)
+        except RenderQueueFull:
+            logging.warning(f'Timeseries: Render queue full, rejected {item_name} ({item_id}) for {ctx.author}')
+            await ctx.respond('Too many charts are being drawn right now, try again in a moment')
+            return
+        except Exception as e:
+            logging.exception(f'Timeseries: Rendering {item_name} ({item_id}) failed: {e!r}')
+            await ctx.respond('Failed to draw the chart, try again in a moment')
+            return
+        chart_cache.put(chart_key, image)
 
     # Create file
-    data_stream.seek(0)
-    chart = discord.File(data_stream, filename="price_history.png")
+    chart = discord.File(io.BytesIO(image), filename=f"price_history.{chart_extension}")
 
     # Populate Embed item
     embed = discord.Embed(title=f'{item_name.capitalize()} - {timestep} Timeseries',
-                          url=f'https://prices.runescape.wiki/osrs/item/{item_id}')
-    embed.set_thumbnail(url='https://oldschool.runescape.wiki/images/' + item_map[item_id]['icon'].replace(' ', '_'))
+                          url=item_meta[item_id].prices_url)
+    embed.set_thumbnail(url=item_meta[item_id].icon_url)
     embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
-    embed.set_image(url="attachment://price_history.png")
+    embed.set_image(url=f"attachment://price_history.{chart_extension}")
+
+    with metrics.span('timeseries', 'respond'):
+        await ctx.respond(file=chart, embed=embed)
 
-    await ctx.respond(file=chart, embed=embed)
+
+@bot.slash_command(description='Chart the price changes of several items together')
+@option('items', description='Item IDs or names (separate with | for multiple)', required=True,
+        autocomplete=items_autocomplete)
+@option('timestep', description='Step for time stamps (5m, 1h, 6h, 24h)', required=False, default='1h',
+        choices=list(TIMESTEP_SECONDS))
+@option('points', description='Number of points to chart (Default 365)', required=False, default=365, min_value=2,
+        max_value=history_max_points)
+@option('size', description='Chart size', required=False, default=None, choices=list(CHART_SIZES))
+async def compare(ctx: discord.ApplicationContext, items: str, timestep: str, points: int, size: str):
+    ids, unresolved = convert_names_to_ids(items)
+
+    if ids is None or ids == '':
+        logging.warning(f'Compare: User {ctx.author} submitted {items} which converted to {ids} and broke /compare')
+        await ctx.respond(not_found_message(unresolved))
+        return
+
+    id_list = list(dict.fromkeys(ids.split('|')))
+    dropped = max(0, len(id_list) - compare_max_items)
+    id_list = id_list[:compare_max_items]
+
+    await ctx.defer()
+
+    # One fetch per item, all at once; the wiki client spaces them out and shares duplicate requests
+    with metrics.span('compare', 'fetch'):
+        available = await asyncio.gather(*(update_history(item_id, timestep) for item_id in id_list))
+    missing = [item_map[item_id]['name'] for item_id, ok in zip(id_list, available) if not ok]
+    id_list = [item_id for item_id, ok in zip(id_list, available) if ok]
+    if not id_list:
+        await ctx.respond('Failed lookup, the wiki did not return a timeseries for any of these items')
+        return
+
+    with metrics.span('compare', 'transform'):
+        series = await asyncio.gather(*(run_blocking(price_history.read_array, item_id, timestep, points)
+                                        for item_id in id_list))
+
+    size = size or chart_size
+    chart_key = ('compare', tuple(id_list), timestep, points, size,
+                 tuple(int(data[-1, 0]) if len(data) else None for data in series))
+    image = chart_cache.get(chart_key)
+    if image is None:
+        try:
+            image = await render_chart('compare', render_comparison, series, TIMESTEP_SECONDS[timestep],
+                                       [item_map[item_id]['name'] for item_id in id_list], size)
+        except RenderQueueFull:
+            logging.warning(f'Compare: Render queue full, rejected {id_list} for {ctx.author}')
+            await ctx.respond('Too many charts are being drawn right now, try again in a moment')
+            return
+        except Exception as e:
+            logging.exception(f'Compare: Rendering {id_list} failed: {e!r}')
+            await ctx.respond('Failed to draw the chart, try again in a moment')
+            return
+        chart_cache.put(chart_key, image)
+
+    chart = discord.File(io.BytesIO(image), filename=f"price_comparison.{chart_extension}")
+
+    embed = discord.Embed(title=f'Price Comparison - {timestep} Timeseries',
+                          description=', '.join(item_map[item_id]['name'] for item_id in id_list))
+    embed.set_image(url=f"attachment://price_comparison.{chart_extension}")
+    sign_embed(ctx, embed)
+
+    notes = []
+    if unresolved:
+        notes.append(unresolved_note(unresolved) + '.')
+    if dropped:
+        notes.append(f'Only the first {compare_max_items} items are compared, {dropped} more were left out.')
+    if missing:
+        notes.append(f"No price history is available for {', '.join(missing)}.")
+
+    with metrics.span('compare', 'respond'):
+        await ctx.respond(' '.join(notes) or None, file=chart, embed=embed)
 
 
 @bot.slash_command(description='Look up item property(ies)')
-@option('item', description='Which item name or item ID to look up', required=True)
+@option('item', description='Which item name or item ID to look up', required=True,
+        autocomplete=item_autocomplete)
 @option('game', description='OSRS or RS3', required=True, default='osrs')
 @option('prop', description='Which property(ies) to look up (separate with |)', required=False, default='all')
 async def property_lookup(ctx: discord.ApplicationContext, item: str, game: str, prop: str):
-    item_id, item_name = item_to_tuple(item)
+    item_id, item_name, missing = resolve_item(item)
 
     if item_id is None or item_name is None:
         logging.warning(f'Property_lookup: User {ctx.author} submitted {item} which converted to '
                         f'({item_id}, {item_name}) is not a valid item pair')
-        await ctx.respond('Unable to find any valid items that match your request, '
-                          'try `/itemid` to look up any partial item names')
+        await ctx.respond(not_found_message(missing))
         return
 
     game = game.lower()
@@ -494,36 +1418,100 @@ async def property_lookup(ctx: discord.ApplicationContext, item: str, game: str,
 
     await ctx.defer()
 
-    properties = MediaWiki(game.lower(), user_agent=user_agent)
-    properties.browse_properties(item_name)
-    properties._clean_properties()
+    try:
+        with metrics.span('property_lookup', 'fetch'):
+            content = await get_properties(game, item_name)
+    except WikiError as e:
+        logging.warning(f'Property_lookup: Browsing {item_name} ({game}) failed: {e}')
+        await ctx.respond('The wiki did not respond, try again in a moment')
+        return
 
-    properties.content = {k.lower(): v for k, v in properties.content.items()}
+    with metrics.span('property_lookup', 'transform'):
+        embed = discord.Embed(title=f'{item_name} - Properties',
+                              url=game_link + 'w/' + item_name.replace(' ', '_'))
+        embed.set_thumbnail(url=game_link + 'images/' + item_meta[item_name].icon)
 
-    embed = discord.Embed(title=f'{item_name} - Properties',
-                          url=game_link + 'w/' + item_name.replace(' ', '_'))
-    embed.set_thumbnail(url=game_link + 'images/' + item_map[item_name]['icon'].replace(' ', '_'))
+        if prop == 'all':
+            to_show = list(content.keys())
+        else:
+            to_show = prop.split('|')
 
-    if prop == 'all':
-        to_show = list(properties.content.keys())
-    else:
-        to_show = prop.split('|')
+        for p in to_show:
+            keys = [a for a in content.keys() if p.lower() in a.lower()]
+            if keys:
+                for key in keys:
+                    embed.add_field(name=f"{key.capitalize()}",
+                                    value=f'{content.get(key)}')
 
-    for p in to_show:
-        keys = [a for a in properties.content.keys() if p.lower() in a.lower()]
-        if keys:
-            for key in keys:
-                embed.add_field(name=f"{key.capitalize()}",
-                                value=f'{properties.content.get(key)}')
+        if not embed.fields:
+            embed.add_field(name="No properties found",
+                            value='Try using another prop filter or use `all` to see a list of properties')
 
-    if not embed.fields:
-        embed.add_field(name="No properties found",
-                        value='Try using another prop filter or use `all` to see a list of properties')
+        sign_embed(ctx, embed)
 
-    embed.set_author(name=ctx.author.display_name, url=ctx.author.jump_url, icon_url=ctx.author.display_avatar.url)
-    embed.set_footer(text="RSWiki Bot is created by Garrett#8250")
+    with metrics.span('property_lookup', 'respond'):
+        await ctx.respond(embed=embed)
 
-    await ctx.respond(embed=embed)
+
+watch = bot.create_group('watch', 'Price alerts for items')
+
+
+@watch.command(name='add', description='Get notified when an item price crosses a threshold')
+@option('item', description='Item name or item ID', required=True, autocomplete=item_autocomplete)
+@option('price', description='Price to alert at', required=True, min_value=1)
+@option('direction', description='Alert when the price goes above or below the threshold', required=False,
+        default='above', choices=['above', 'below'])
+@option('price_type', description='Buy (instant buy) or sell (instant sell) price (Default buy)', required=False,
+        default='buy', choices=list(WATCH_FIELDS))
+@option('here', description='Post the alert in this channel instead of a DM (Default no)', required=False,
+        default=False)
+async def watch_add(ctx: discord.ApplicationContext, item: str, price: int, direction: str, price_type: str,
+                    here: bool):
+    item_id, item_name, missing = resolve_item(item)
+
+    if item_id is None or item_name is None:
+        logging.warning(f'Watch: User {ctx.author} submitted {item} which converted to '
+                        f'({item_id}, {item_name}) is not a valid item pair')
+        await ctx.respond(not_found_message(missing))
+        return
+
+    existing = await run_blocking(watch_list.for_user, ctx.author.id)
+    if len(existing) >= watch_max_per_user:
+        await ctx.respond(f'You already have {len(existing)} alerts, remove some with `/watch remove` first')
+        return
+
+    channel_id = ctx.channel_id if here else None
+    watch_id = await run_blocking(watch_list.add, ctx.author.id, item_id, price_type, direction == 'above', price,
+                                  channel_id)
+
+    where = 'in this channel' if here else 'by DM'
+    await ctx.respond(f'Alert #{watch_id} set: you will be notified {where} when the {price_type} price of '
+                      f'{item_name} is {direction} {price:,}')
+
+
+@watch.command(name='list', description='List your price alerts')
+async def watch_show(ctx: discord.ApplicationContext):
+    rows = await run_blocking(watch_list.for_user, ctx.author.id)
+    if not rows:
+        await ctx.respond('You have no price alerts, add one with `/watch add`')
+        return
+
+    table = []
+    for row in rows:
+        item = item_map.get(str(row['item_id']))
+        table.append((item['name'] if item else row['item_id'], f"#{row['id']}", row['field'],
+                      'above' if row['above'] else 'below', format_price(row['threshold'])))
+    embeds = table_embeds(ctx, 'Price Alerts', ('Item', 'Alert', 'Price', 'When', 'Threshold'), table)
+    await respond_embeds(ctx, embeds)
+
+
+@watch.command(name='remove', description='Remove one of your price alerts')
+@option('alert', description='The alert number shown by /watch list', required=True, min_value=1)
+async def watch_remove(ctx: discord.ApplicationContext, alert: int):
+    if await run_blocking(watch_list.remove, ctx.author.id, alert):
+        await ctx.respond(f'Alert #{alert} removed')
+    else:
+        await ctx.respond(f'You have no alert #{alert}, see `/watch list`')
 
 
 @bot.slash_command(name='search', description='Search the wiki for a page')
@@ -546,13 +1534,109 @@ async def wiki_search(ctx: discord.ApplicationContext, page: str, game: str):
 @bot.slash_command(name='itemid', description='Lookup the ID of an item')
 @option('name', description='Item Name', required=True)
 async def id_lookup(ctx: discord.ApplicationContext, name: str):
-    response = [(k, v['id']) for k, v in item_map.items() if name.lower() in k.lower()]
+    with metrics.span('itemid', 'transform'):
+        response = [(d['name'], d['id']) for d in item_index.search(name)]
+        match = item_index.exact(name)
+        if name.strip().isnumeric() and match is not None:
+            response.insert(0, (match['name'], match['id']))
+        if not response:
+            match, suggestions = item_index.resolve(name)
+            matches = [match] if match is not None else [item_index.exact(suggestion) for suggestion in suggestions]
+            response = [(d['name'], d['id']) for d in matches]
 
-    if len(response) > 2000:
-        response = 'Cannot provide information for that many itemIDs, try specifying fewer itemIDs'
+        if len(str(response)) > 2000:
+            response = 'Cannot provide information for that many itemIDs, try specifying fewer itemIDs'
 
-    await ctx.respond(response)
+    with metrics.span('itemid', 'respond'):
+        await ctx.respond(response)
 
 
-if __name__ == '__main__':
+admin = bot.create_group('admin', 'Bot maintenance commands',
+                         default_member_permissions=discord.Permissions(administrator=True))
+
+
+async def is_bot_admin(ctx: discord.ApplicationContext):
+    """
+    Checks the user is a bot owner or listed in ADMIN_IDS, and tells them off if not. Server administrators can see the
+    /admin commands but they act on the whole bot, so they are limited further.
+    """
+    if ctx.author.id in admin_ids or await bot.is_owner(ctx.author):
+        return True
+    logging.warning(f'Admin: User {ctx.author} tried to use {ctx.command}')
+    await ctx.respond('Only bot admins can use this command', ephemeral=True)
+    return False
+
+
+@admin.command(name='invalidate_properties', description='Drop cached item properties')
+@option('item', description='Item name or ID to drop (Default all items)', required=False, default=None,
+        autocomplete=item_autocomplete)
+@option('game', description='OSRS or RS3 (Default both)', required=False, default=None, choices=['osrs', 'rs3'])
+async def admin_invalidate_properties(ctx: discord.ApplicationContext, item: str, game: str):
+    if not await is_bot_admin(ctx):
+        return
+
+    item_name = None
+    if item is not None:
+        _, item_name = item_to_tuple(item)
+        if item_name is None:
+            await ctx.respond(f'Unknown item {item}', ephemeral=True)
+            return
+
+    dropped = await run_blocking(property_cache.invalidate, game, item_name)
+    logging.info(f'Admin: {ctx.author} invalidated properties for {item_name or "all items"} ({game or "all games"})')
+    shared = ', the other processes drop theirs on their next lookup' if property_cache.stats()['on_disk'] else ''
+    await ctx.respond(f'Dropped cached properties for {item_name or "all items"} ({game or "all games"}), '
+                      f'{dropped} were in this process\'s memory{shared}', ephemeral=True)
+
+
+@admin.command(name='prefetch_properties', description='Cache the properties of the most requested items now')
+@option('count', description='How many of the most requested items (Default 50)', required=False, default=50,
+        min_value=1, max_value=500)
+@option('game', description='OSRS or RS3 (Default both)', required=False, default=None, choices=['osrs', 'rs3'])
+async def admin_prefetch_properties(ctx: discord.ApplicationContext, count: int, game: str):
+    if not await is_bot_admin(ctx):
+        return
+
+    await ctx.defer(ephemeral=True)
+    fetched = await prefetch_properties(count, game)
+    await ctx.respond(f'Fetched properties for {fetched} of the {count} most requested items, the rest were '
+                      f'already cached ({property_cache.stats()})', ephemeral=True)
+
+
+@admin.command(name='stats', description='Command latency and cache statistics')
+async def admin_stats(ctx: discord.ApplicationContext):
+    if not await is_bot_admin(ctx):
+        return
+
+    rows = [(command, stage, count, f'{mean:.1f}', f'{p50:.0f}', f'{p99:.0f}')
+            for command, stage, count, mean, p50, p99 in metrics.summary()]
+    embeds = table_embeds(ctx, 'Command Latency (ms)', ('Command', 'Stage', 'Count', 'Mean', 'p50', 'p99'), rows) \
+        if rows else []
+
+    embed = discord.Embed(title='Caches and Pools')
+    for name, func in metrics.collectors.items():
+        embed.add_field(name=name, value='\n'.join(f'{k}: {v}' for k, v in func().items()), inline=True)
+    embeds.append(embed)
+    await respond_embeds(ctx, embeds)
+
+
+@admin.command(name='profile', description='Profile the next command invocations with cProfile')
+@option('count', description='How many invocations to sample (0 to stop)', required=False, default=1, min_value=0,
+        max_value=100)
+@option('command', description='Only sample this command (Default any)', required=False, default=None)
+async def admin_profile(ctx: discord.ApplicationContext, count: int, command: str):
+    if not await is_bot_admin(ctx):
+        return
+
+    profiler.arm(count, command)
+    await ctx.respond(f'Profiling the next {count} invocations of {"/" + command if command else "any command"}, '
+                      f'results are logged and saved to {profiler.directory}', ephemeral=True)
+
+
+def main():
+    setup()
     bot.run(os.getenv('TOKEN'))
+
+
+if __name__ == '__main__':
+    main()